@@ -4,4 +4,87 @@ from dotenv import load_dotenv
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_API_KEY = os.getenv("SUPABASE_API_KEY")
\ No newline at end of file
+SUPABASE_API_KEY = os.getenv("SUPABASE_API_KEY")
+
+# Observium
+OBSERVIUM_API_BASE = os.getenv("API_URL")
+OBSERVIUM_API_GRAPH = os.getenv("OBSERVIUM_API_GRAPH")
+OBS_USER = os.getenv("API_USERNAME") or ""
+OBS_PASS = os.getenv("API_PASSWORD") or ""
+
+# Pool de conexiones HTTP compartido hacia Observium
+OBSERVIUM_MAX_CONNECTIONS = int(os.getenv("OBSERVIUM_MAX_CONNECTIONS", "50"))
+OBSERVIUM_MAX_KEEPALIVE = int(os.getenv("OBSERVIUM_MAX_KEEPALIVE", "20"))
+OBSERVIUM_KEEPALIVE_EXPIRY = float(os.getenv("OBSERVIUM_KEEPALIVE_EXPIRY", "60"))
+OBSERVIUM_CONNECT_TIMEOUT = float(os.getenv("OBSERVIUM_CONNECT_TIMEOUT", "10"))
+OBSERVIUM_READ_TIMEOUT = float(os.getenv("OBSERVIUM_READ_TIMEOUT", "120"))
+OBSERVIUM_POOL_TIMEOUT = float(os.getenv("OBSERVIUM_POOL_TIMEOUT", "30"))
+OBSERVIUM_HTTP2 = os.getenv("OBSERVIUM_HTTP2", "false").lower() in ("1", "true", "yes")
+
+# Hilos dedicados a las llamadas (síncronas) al cliente de Supabase
+SUPABASE_MAX_WORKERS = int(os.getenv("SUPABASE_MAX_WORKERS", "16"))
+
+# Procesos para el ajuste de modelos de predicción (0 = número de CPUs)
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", "0")) or None
+# Motor de predicción por defecto: prophet | holtwinters | linear
+FORECAST_ENGINE = os.getenv("FORECAST_ENGINE", "prophet").lower()
+# Periodo estacional (en pasos) para holtwinters/linear; 0 = sin estacionalidad
+FORECAST_SEASON_LENGTH = int(os.getenv("FORECAST_SEASON_LENGTH", "7"))
+
+# Caché en disco de predicciones por serie
+FORECAST_CACHE_PATH = os.getenv("FORECAST_CACHE_PATH", "forecast_cache.sqlite3")
+FORECAST_CACHE_MAX_BYTES = int(os.getenv("FORECAST_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Tamaño de lote para escrituras masivas en Supabase
+ALERTS_SYNC_CHUNK_SIZE = int(os.getenv("ALERTS_SYNC_CHUNK_SIZE", "500"))
+# Huellas de contenido de la última sincronización de alertas
+ALERTS_STATE_PATH = os.getenv("ALERTS_STATE_PATH", "alerts_sync_state.json")
+
+# Caché en memoria de metadatos de dispositivos (/devices/{id})
+DEVICE_CACHE_TTL = float(os.getenv("DEVICE_CACHE_TTL", "300"))
+DEVICE_CACHE_MAX_ENTRIES = int(os.getenv("DEVICE_CACHE_MAX_ENTRIES", "5000"))
+# Tiempo durante el que se reutiliza el inventario completo de /devices
+DEVICE_INVENTORY_TTL = float(os.getenv("DEVICE_INVENTORY_TTL", "300"))
+
+# Resoluciones IP -> dispositivo simultáneas contra Observium
+ADDRESS_RESOLVE_CONCURRENCY = int(os.getenv("ADDRESS_RESOLVE_CONCURRENCY", "10"))
+
+# Tabla de prefijos IP -> core (coincidencia por prefijo más largo)
+CORE_PREFIXES_PATH = os.getenv(
+    "CORE_PREFIXES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "core_prefixes.json"),
+)
+
+# Refresco incremental de device_names
+DEVICE_NAMES_TTL = float(os.getenv("DEVICE_NAMES_TTL", str(24 * 3600)))
+DEVICE_NAMES_STATE_PATH = os.getenv("DEVICE_NAMES_STATE_PATH", "device_names_state.json")
+
+# Snapshot en memoria de /ports (segundos entre refrescos)
+PORT_SNAPSHOT_TTL = float(os.getenv("PORT_SNAPSHOT_TTL", "300"))
+
+# Histórico local de contadores de puertos (SQLite)
+COUNTER_HISTORY_PATH = os.getenv("COUNTER_HISTORY_PATH", "port_counters.sqlite3")
+COUNTER_HISTORY_INTERVAL = int(os.getenv("COUNTER_HISTORY_INTERVAL", "900"))
+COUNTER_HISTORY_RETENTION_DAYS = float(os.getenv("COUNTER_HISTORY_RETENTION_DAYS", "30"))
+
+# Fallas de puertos: top-k por defecto e histórico para tendencias (SQLite)
+FAILURE_TOP_K = int(os.getenv("FAILURE_TOP_K", "5"))
+FAILURE_HISTORY_PATH = os.getenv("FAILURE_HISTORY_PATH", "port_failures.sqlite3")
+FAILURE_HISTORY_INTERVAL = int(os.getenv("FAILURE_HISTORY_INTERVAL", "3600"))
+FAILURE_HISTORY_RETENTION_DAYS = float(os.getenv("FAILURE_HISTORY_RETENTION_DAYS", "30"))
+
+# Tablas snapshot de Supabase: versiones que se conservan además de la última
+SNAPSHOT_KEEP_VERSIONS = max(1, int(os.getenv("SNAPSHOT_KEEP_VERSIONS", "3")))
+# Segundos que se sirve el snapshot cacheado en memoria antes de revalidar su versión
+SNAPSHOT_CACHE_TTL = float(os.getenv("SNAPSHOT_CACHE_TTL", "60"))
+
+# Cuerpos de respuesta grandes: segundos que se reutiliza el payload de Observium (/graphs, /ports)
+RAW_PAYLOAD_TTL = float(os.getenv("RAW_PAYLOAD_TTL", "60"))
+
+# Jobs asíncronos (predicciones): segundos que se conserva un job terminado y máximo de jobs guardados
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "20"))
+
+# Scheduler: desfase aleatorio máximo al arrancar cada job y ejecuciones guardadas por job
+SCHEDULER_JITTER = int(os.getenv("SCHEDULER_JITTER", "120"))
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "50"))
@@ -0,0 +1,223 @@
+import sqlite3
+import threading
+import numpy as np
+from core.config import COUNTER_HISTORY_PATH, COUNTER_HISTORY_INTERVAL, COUNTER_HISTORY_RETENTION_DAYS
+
+_MAX_SQLITE_INT = 2 ** 63 - 1
+# Los contadores son uint64 y SQLite solo guarda enteros con signo de 64 bits,
+# así que cada uno se guarda partido en sus 32 bits altos (_hi) y bajos (_lo)
+_LOW_MASK = np.uint64(0xFFFFFFFF)
+
+# Diferencias entre muestras consecutivas de cada puerto, calculadas en SQLite
+# (LAG por port_id) para no traer cada muestra a Python. Un incremento vale si
+# no supera lo que permite ifSpeed en el intervalo (o si no se conoce ifSpeed).
+# Si el contador baja solo se acepta como vuelta de un contador de 32 bits
+# (valor previo < 2^32) cuando la tasa resultante es plausible para ifSpeed; en
+# cualquier otro caso (velocidad desconocida, contador de 64 bits) se toma como
+# un reinicio y el delta de ese sentido queda en NULL.
+_DELTAS_SQL = """
+WITH ordered AS (
+    SELECT s.ts, s.port_id, s.speed,
+           s.in_hi, s.in_lo, s.out_hi, s.out_lo,
+           LAG(s.ts) OVER w AS prev_ts,
+           LAG(s.in_hi) OVER w AS prev_in_hi,
+           LAG(s.in_lo) OVER w AS prev_in_lo,
+           LAG(s.out_hi) OVER w AS prev_out_hi,
+           LAG(s.out_lo) OVER w AS prev_out_lo
+    FROM samples s JOIN ports p ON p.port_id = s.port_id
+    WHERE {where}
+    WINDOW w AS (PARTITION BY s.port_id ORDER BY s.ts)
+),
+raw AS (
+    SELECT prev_ts AS t0, ts AS t1, port_id, prev_in_hi, prev_out_hi,
+           (in_hi - prev_in_hi) * 4294967296 + (in_lo - prev_in_lo) AS d_in,
+           (out_hi - prev_out_hi) * 4294967296 + (out_lo - prev_out_lo) AS d_out,
+           CASE WHEN speed > 0 THEN speed / 8.0 * (ts - prev_ts) * 1.05 END AS max_octets
+    FROM ordered
+    WHERE prev_ts IS NOT NULL AND ts > prev_ts
+),
+deltas AS (
+    SELECT t0, t1, port_id,
+           CASE
+               WHEN d_in >= 0 THEN CASE WHEN max_octets IS NULL OR d_in <= max_octets THEN d_in END
+               WHEN max_octets IS NULL OR prev_in_hi > 0 THEN NULL
+               WHEN d_in + 4294967296 <= max_octets THEN d_in + 4294967296
+           END AS d_in,
+           CASE
+               WHEN d_out >= 0 THEN CASE WHEN max_octets IS NULL OR d_out <= max_octets THEN d_out END
+               WHEN max_octets IS NULL OR prev_out_hi > 0 THEN NULL
+               WHEN d_out + 4294967296 <= max_octets THEN d_out + 4294967296
+           END AS d_out
+    FROM raw
+)
+"""
+
+
+def _split(values: np.ndarray) -> tuple[list, list]:
+    """(32 bits altos, 32 bits bajos) de un array uint64, como listas de int"""
+    values = values.astype(np.uint64)
+    return (values >> np.uint64(32)).tolist(), (values & _LOW_MASK).tolist()
+
+
+class CounterHistory:
+    """Muestras append-only de ifInOctets/ifOutOctets por puerto, en SQLite.
+
+    Se guarda como mucho una muestra cada `interval` segundos, para acotar lo
+    que crece la base por día aunque el snapshot se refresque más seguido.
+    """
+
+    def __init__(
+        self,
+        path: str = COUNTER_HISTORY_PATH,
+        interval: float = COUNTER_HISTORY_INTERVAL,
+        retention_days: float = COUNTER_HISTORY_RETENTION_DAYS,
+    ):
+        self.path = path
+        self.interval = interval
+        self.retention_seconds = retention_days * 86400
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._migrate()
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS samples (
+                ts INTEGER NOT NULL,
+                port_id INTEGER NOT NULL,
+                in_hi INTEGER NOT NULL,
+                in_lo INTEGER NOT NULL,
+                out_hi INTEGER NOT NULL,
+                out_lo INTEGER NOT NULL,
+                speed INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS samples_port_ts ON samples (port_id, ts);
+            CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+            CREATE TABLE IF NOT EXISTS ports (
+                port_id INTEGER PRIMARY KEY,
+                device TEXT,
+                label TEXT,
+                descr_type TEXT
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _migrate(self):
+        """Pasa una base con el esquema anterior (in_octets/out_octets) al de columnas _hi/_lo"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(samples)")}
+        if "in_octets" not in columns:
+            return
+        self._conn.executescript(
+            """
+            DROP INDEX IF EXISTS samples_port_ts;
+            DROP INDEX IF EXISTS samples_ts;
+            ALTER TABLE samples RENAME TO samples_old;
+            CREATE TABLE samples (
+                ts INTEGER NOT NULL,
+                port_id INTEGER NOT NULL,
+                in_hi INTEGER NOT NULL,
+                in_lo INTEGER NOT NULL,
+                out_hi INTEGER NOT NULL,
+                out_lo INTEGER NOT NULL,
+                speed INTEGER NOT NULL
+            );
+            INSERT INTO samples (ts, port_id, in_hi, in_lo, out_hi, out_lo, speed)
+                SELECT ts, port_id, in_octets >> 32, in_octets & 4294967295,
+                       out_octets >> 32, out_octets & 4294967295, speed
+                FROM samples_old;
+            DROP TABLE samples_old;
+            """
+        )
+        self._conn.commit()
+
+    def append(self, ts: float, table) -> bool:
+        """Guarda una muestra de todos los puertos de una PortTable si pasó el intervalo, y poda lo que excede la retención"""
+        ts = int(ts)
+        in_hi, in_lo = _split(table.columns["ifInOctets"])
+        out_hi, out_lo = _split(table.columns["ifOutOctets"])
+        # ifSpeed no es un contador: solo se acota para que quepa en INTEGER
+        speeds = np.minimum(table.columns["ifSpeed"], _MAX_SQLITE_INT).tolist()
+        port_ids = table.port_ids.tolist()
+        device_labels = table.labels["device"]
+        type_labels = table.labels["type"]
+        devices = [device_labels[code] for code in table.codes["device"].tolist()]
+        types = [type_labels[code] for code in table.codes["type"].tolist()]
+
+        with self._lock:
+            last = self._conn.execute("SELECT MAX(ts) FROM samples").fetchone()[0]
+            if last is not None and ts - last < self.interval:
+                return False
+            self._conn.executemany(
+                "INSERT INTO samples (ts, port_id, in_hi, in_lo, out_hi, out_lo, speed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                zip([ts] * len(port_ids), port_ids, in_hi, in_lo, out_hi, out_lo, speeds),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ports (port_id, device, label, descr_type) VALUES (?, ?, ?, ?)",
+                zip(port_ids, devices, table.port_labels, types),
+            )
+            self._conn.execute("DELETE FROM samples WHERE ts < ?", (ts - self.retention_seconds,))
+            self._conn.commit()
+        return True
+
+    def _deltas(self, select: str, start: float, end: float, port_id: int | None = None, descr_type: str | None = None):
+        where = "s.ts BETWEEN ? AND ?"
+        params: list = [int(start), int(end)]
+        if port_id is not None:
+            where += " AND s.port_id = ?"
+            params.append(port_id)
+        if descr_type is not None:
+            where += " AND p.descr_type = ?"
+            params.append(descr_type)
+        with self._lock:
+            return self._conn.execute(_DELTAS_SQL.format(where=where) + select, params).fetchall()
+
+    def rates(self, port_id: int, start: float, end: float) -> list:
+        """Serie de bps de entrada/salida de un puerto entre start y end"""
+        # Un intervalo puede ser válido para un sentido y no para el otro
+        rows = self._deltas(
+            "SELECT t0, t1, d_in, d_out FROM deltas WHERE d_in IS NOT NULL OR d_out IS NOT NULL ORDER BY t1",
+            start, end, port_id=port_id,
+        )
+        return [
+            {
+                "ts": int(t1),
+                "in_bps": d_in * 8 / (t1 - t0) if d_in is not None else None,
+                "out_bps": d_out * 8 / (t1 - t0) if d_out is not None else None,
+            }
+            for t0, t1, d_in, d_out in rows
+        ]
+
+    def consumption(self, start: float, end: float, descr_type: str | None = None) -> dict:
+        """Octetos transferidos entre start y end (suma de deltas) y bps medio, agregados en SQLite"""
+        total_in, total_out, ports, first, last = self._deltas(
+            "SELECT TOTAL(d_in), TOTAL(d_out),"
+            " COUNT(DISTINCT CASE WHEN d_in IS NOT NULL THEN port_id END),"
+            " MIN(CASE WHEN d_in IS NOT NULL THEN t0 END),"
+            " MAX(CASE WHEN d_in IS NOT NULL THEN t1 END)"
+            " FROM deltas",
+            start, end, descr_type=descr_type,
+        )[0]
+        covered = float(last - first) if first is not None else 0.0
+
+        return {
+            "start": int(start),
+            "end": int(end),
+            "port_descr_type": descr_type,
+            "ports": ports,
+            "in_octets": int(total_in),
+            "out_octets": int(total_out),
+            "total_octets": int(total_in + total_out),
+            "total_gb": round((total_in + total_out) / (1024 ** 3), 2),
+            "avg_in_bps": round(total_in * 8 / covered, 2) if covered else None,
+            "avg_out_bps": round(total_out * 8 / covered, 2) if covered else None,
+            "covered_seconds": int(covered),
+        }
+
+
+_history: CounterHistory | None = None
+
+
+def get_counter_history() -> CounterHistory:
+    global _history
+    if _history is None:
+        _history = CounterHistory()
+    return _history
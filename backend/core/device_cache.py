@@ -0,0 +1,162 @@
+import asyncio
+import time
+from collections import OrderedDict
+from core.config import OBSERVIUM_API_BASE, DEVICE_CACHE_TTL, DEVICE_CACHE_MAX_ENTRIES, DEVICE_INVENTORY_TTL
+from core.observium import get_observium_client
+
+
+class DeviceCache:
+    """Caché LRU con TTL para /devices/{id}.
+
+    Guarda solo el objeto 'device' (venga de /devices/{id} o del inventario);
+    la forma de la respuesta de la API se arma en device_response.
+    Las peticiones concurrentes por el mismo dispositivo que no están en caché
+    comparten una única llamada a Observium (single-flight).
+    """
+
+    def __init__(self, ttl: float = DEVICE_CACHE_TTL, max_entries: int = DEVICE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, device_id) -> dict | None:
+        """Objeto 'device' de Observium, o None si Observium no lo devolvió"""
+        key = str(device_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: si un cliente cancela, la petición compartida sigue para los demás
+        return await asyncio.shield(task)
+
+    def put(self, device_id, value: dict):
+        key = str(device_id)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _load(self, key: str) -> dict | None:
+        client = get_observium_client()
+        response = await client.get(f"{OBSERVIUM_API_BASE}/devices/{key}")
+        if response.status_code != 200:
+            return None
+        value = response.json()
+        device = value.get("device") if isinstance(value, dict) else None
+        if not isinstance(device, dict):
+            return None
+        self.put(key, device)
+        return device
+
+    def invalidate(self, device_id=None) -> int:
+        """Elimina un dispositivo (o todos si device_id es None); devuelve cuántas entradas se borraron"""
+        if device_id is None:
+            removed = len(self._entries)
+            self._entries.clear()
+            return removed
+        return 1 if self._entries.pop(str(device_id), None) is not None else 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+class DeviceInventory:
+    """Snapshot del inventario completo (/devices) indexado por device_id.
+
+    Se descarga una sola vez cada DEVICE_INVENTORY_TTL segundos (con single-flight)
+    y alimenta también la caché por dispositivo.
+    """
+
+    def __init__(self, cache: DeviceCache, ttl: float = DEVICE_INVENTORY_TTL):
+        self.cache = cache
+        self.ttl = ttl
+        self._index: dict[str, dict] = {}
+        self._fetched_at: float | None = None
+        self._inflight: asyncio.Task | None = None
+        self.refreshes = 0
+
+    def is_fresh(self) -> bool:
+        return self._fetched_at is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    async def get_index(self) -> dict[str, dict]:
+        """{device_id: objeto device} del snapshot vigente, descargándolo si caducó"""
+        if self.is_fresh():
+            return self._index
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._load())
+            self._inflight.add_done_callback(lambda _: setattr(self, "_inflight", None))
+        return await asyncio.shield(self._inflight)
+
+    async def _load(self) -> dict[str, dict]:
+        client = get_observium_client()
+        response = await client.get(f"{OBSERVIUM_API_BASE}/devices")
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to fetch device inventory (HTTP {response.status_code})")
+
+        devices = response.json().get("devices", {}) or {}
+        if isinstance(devices, list):
+            devices = {device.get("device_id"): device for device in devices}
+
+        index = {}
+        for device_id, device in devices.items():
+            if not isinstance(device, dict):
+                continue
+            key = str(device.get("device_id", device_id))
+            index[key] = device
+            self.cache.put(key, device)
+
+        self._index = index
+        self._fetched_at = time.monotonic()
+        self.refreshes += 1
+        return index
+
+    def invalidate(self):
+        self._index = {}
+        self._fetched_at = None
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self._index),
+            "ttl_seconds": self.ttl,
+            "age_seconds": round(time.monotonic() - self._fetched_at, 1) if self._fetched_at is not None else None,
+            "refreshes": self.refreshes,
+        }
+
+
+device_cache = DeviceCache()
+device_inventory = DeviceInventory(device_cache)
+
+
+def device_response(device: dict) -> dict:
+    """Misma forma que la respuesta de Observium para /devices/{id}"""
+    return {"status": "ok", "device": device}
+
+
+async def get_device_info(device_id) -> dict:
+    """Objeto 'device' de Observium para un ID ({} si no se pudo obtener)"""
+    return await device_cache.get(device_id) or {}
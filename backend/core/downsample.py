@@ -0,0 +1,95 @@
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(x: np.ndarray, matrix: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets para todas las columnas de `matrix` a la vez.
+
+    `x` son los timestamps (n,) y `matrix` los valores (n, n_series) con NaN en
+    los huecos. Devuelve los índices de fila elegidos, (threshold, n_series).
+    El bucle recorre los buckets; dentro de cada bucket todas las series se
+    resuelven con operaciones vectorizadas.
+    """
+    n, width = matrix.shape
+    if threshold >= n or threshold < 3:
+        return np.repeat(np.arange(n)[:, None], width, axis=1)
+
+    x = np.asarray(x, dtype=float)
+    columns = np.arange(width)
+    valid = ~np.isnan(matrix)
+    filled = np.where(valid, matrix, 0.0)
+
+    selected = np.empty((threshold, width), dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    anchor = np.zeros(width, dtype=np.int64)
+    every = (n - 2) / (threshold - 2)
+
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+
+        # Punto medio del bucket siguiente (ignorando NaN)
+        count = valid[end:next_end].sum(axis=0)
+        avg_x = x[end:next_end].mean()
+        avg_y = np.divide(
+            filled[end:next_end].sum(axis=0), count,
+            out=np.full(width, np.nan), where=count > 0,
+        )
+
+        ax = x[anchor]
+        ay = matrix[anchor, columns]
+        bx = x[start:end][:, None]
+        by = matrix[start:end]
+        area = np.abs((ax - avg_x) * (by - ay) - (ax - bx) * (avg_y - ay))
+
+        # Sin área calculable (huecos) se prefiere cualquier punto con valor
+        area = np.where(np.isnan(area), np.where(np.isnan(by), -2.0, -1.0), area)
+        anchor = start + np.argmax(area, axis=0)
+        selected[i + 1] = anchor
+
+    return selected
+
+
+def minmax_indices(matrix: np.ndarray, max_points: int) -> np.ndarray:
+    """Mínimo y máximo de cada bucket (en orden temporal) para todas las series.
+
+    Devuelve índices de fila (2 * n_buckets, n_series), con n_buckets = max_points // 2.
+    """
+    n, width = matrix.shape
+    if max_points >= n:
+        return np.repeat(np.arange(n)[:, None], width, axis=1)
+
+    bucket_size = -(-n // max(1, max_points // 2))
+    buckets = -(-n // bucket_size)
+    padded = np.full((buckets * bucket_size, width), np.nan)
+    padded[:n] = matrix
+    blocks = padded.reshape(buckets, bucket_size, width)
+
+    offsets = np.arange(buckets)[:, None] * bucket_size
+    low = np.argmin(np.where(np.isnan(blocks), np.inf, blocks), axis=1) + offsets
+    high = np.argmax(np.where(np.isnan(blocks), -np.inf, blocks), axis=1) + offsets
+
+    first = np.minimum(low, high)
+    second = np.maximum(low, high)
+    indices = np.empty((2 * buckets, width), dtype=np.int64)
+    indices[0::2] = first
+    indices[1::2] = second
+    return np.minimum(indices, n - 1)
+
+
+def downsample(x: np.ndarray, matrix: np.ndarray, max_points: int, method: str = "lttb"):
+    """Reduce cada serie a como mucho `max_points` puntos; devuelve (timestamps, valores) por columna"""
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}'. Valid methods: {', '.join(METHODS)}")
+    if method == "lttb":
+        indices = lttb_indices(x, matrix, max_points)
+    else:
+        indices = minmax_indices(matrix, max_points)
+
+    columns = np.arange(matrix.shape[1])
+    timestamps = np.asarray(x)[indices]
+    values = matrix[indices, columns[None, :]]
+    return timestamps, values
@@ -0,0 +1,125 @@
+import asyncio
+import gzip
+import json
+import time
+from fastapi import Request, Response
+
+# Dependencias opcionales: orjson serializa mucho más rápido y brotli comprime mejor que gzip
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Por debajo de este tamaño no compensa comprimir
+MIN_COMPRESS_SIZE = 1024
+# Preferencia cuando el cliente acepta varias codificaciones con el mismo q
+_PREFERENCE = ("br", "gzip")
+
+
+def dumps(value) -> bytes:
+    """JSON compacto en bytes (orjson si está instalado)"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _accepted(accept_encoding: str | None) -> dict:
+    """{codificación: q} a partir de la cabecera Accept-Encoding"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+class EncodedBody:
+    """Cuerpo JSON ya serializado, con sus variantes gzip/br calculadas una sola vez"""
+
+    def __init__(self, raw: bytes, compress: bool = True):
+        self.variants = {"identity": raw}
+        if compress and len(raw) >= MIN_COMPRESS_SIZE:
+            self.variants["gzip"] = gzip.compress(raw, compresslevel=6, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(raw, quality=6)
+
+    @classmethod
+    def from_value(cls, value) -> "EncodedBody":
+        return cls(dumps(value))
+
+    @property
+    def raw(self) -> bytes:
+        return self.variants["identity"]
+
+    def sizes(self) -> dict:
+        return {encoding: len(body) for encoding, body in self.variants.items()}
+
+    def pick(self, accept_encoding: str | None) -> tuple[str, bytes]:
+        """Variante comprimida con mayor q aceptada por el cliente; identity si no acepta ninguna"""
+        accepted = _accepted(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        best = None
+        for encoding in _PREFERENCE:
+            if encoding not in self.variants:
+                continue
+            q = accepted.get(encoding, wildcard)
+            if q > 0 and (best is None or q > best[0]):
+                best = (q, encoding)
+        encoding = best[1] if best else "identity"
+        return encoding, self.variants[encoding]
+
+    def response(self, request: Request, status_code: int = 200, headers: dict | None = None) -> Response:
+        encoding, body = self.pick(request.headers.get("accept-encoding"))
+        headers = dict(headers or {})
+        headers["Vary"] = "Accept-Encoding"
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+class BodyCache:
+    """Payload crudo de Observium (bytes JSON) reutilizado durante `ttl` segundos.
+
+    Se descarga una sola vez aunque lleguen varias peticiones a la vez, y las
+    variantes comprimidas se calculan fuera del event loop.
+    """
+
+    def __init__(self, fetch, ttl: float):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.body: EncodedBody | None = None
+        self.fetched_at: float | None = None
+        self._inflight: asyncio.Task | None = None
+
+    async def get(self) -> EncodedBody:
+        if self.body is not None and time.time() - self.fetched_at < self.ttl:
+            return self.body
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._load())
+            self._inflight.add_done_callback(lambda _: setattr(self, "_inflight", None))
+        return await asyncio.shield(self._inflight)
+
+    async def _load(self) -> EncodedBody:
+        raw = await self.fetch()
+        self.body = await asyncio.to_thread(EncodedBody, raw)
+        self.fetched_at = time.time()
+        return self.body
+
+    def invalidate(self):
+        self.body = None
+        self.fetched_at = None
@@ -0,0 +1,122 @@
+import heapq
+import sqlite3
+import threading
+import time
+from core.config import FAILURE_HISTORY_PATH, FAILURE_HISTORY_INTERVAL, FAILURE_HISTORY_RETENTION_DAYS
+
+
+class FailureHistory:
+    """Histórico de conteos de puertos caídos por dispositivo, en SQLite.
+
+    Se guarda como mucho una foto cada `interval` segundos; cada foto queda en
+    `runs` aunque no haya fallas, para que la ausencia de un dispositivo cuente
+    como cero.
+    """
+
+    def __init__(
+        self,
+        path: str = FAILURE_HISTORY_PATH,
+        interval: float = FAILURE_HISTORY_INTERVAL,
+        retention_days: float = FAILURE_HISTORY_RETENTION_DAYS,
+    ):
+        self.path = path
+        self.interval = interval
+        self.retention_seconds = retention_days * 86400
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                ts INTEGER PRIMARY KEY,
+                devices INTEGER NOT NULL,
+                total INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS failures (
+                ts INTEGER NOT NULL,
+                device TEXT NOT NULL,
+                fail_count INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS failures_ts ON failures (ts);
+            """
+        )
+        self._conn.commit()
+
+    def record(self, ts: float, counts: dict) -> bool:
+        """Guarda {device: fail_count} si pasó el intervalo desde la última foto"""
+        ts = int(ts)
+        with self._lock:
+            last = self._conn.execute("SELECT MAX(ts) FROM runs").fetchone()[0]
+            if last is not None and ts - last < self.interval:
+                return False
+            self._conn.execute(
+                "INSERT INTO runs (ts, devices, total) VALUES (?, ?, ?)",
+                (ts, len(counts), sum(counts.values())),
+            )
+            self._conn.executemany(
+                "INSERT INTO failures (ts, device, fail_count) VALUES (?, ?, ?)",
+                [(ts, device, count) for device, count in counts.items()],
+            )
+            cutoff = ts - self.retention_seconds
+            self._conn.execute("DELETE FROM runs WHERE ts < ?", (cutoff,))
+            self._conn.execute("DELETE FROM failures WHERE ts < ?", (cutoff,))
+            self._conn.commit()
+        return True
+
+    def trend(self, days: float = 7, k: int = 10, now: float | None = None) -> dict:
+        """Dispositivos cuyas fallas más crecieron entre la primera y la última foto de la ventana"""
+        now = now if now is not None else time.time()
+        start = int(now - days * 86400)
+        with self._lock:
+            runs = self._conn.execute(
+                "SELECT ts FROM runs WHERE ts >= ? ORDER BY ts", (start,)
+            ).fetchall()
+            rows = self._conn.execute(
+                "SELECT ts, device, fail_count FROM failures WHERE ts >= ?", (start,)
+            ).fetchall()
+
+        result = {"days": days, "snapshots": len(runs), "from": None, "to": None, "devices": []}
+        if len(runs) < 2:
+            return result
+        first, last = runs[0][0], runs[-1][0]
+        result["from"], result["to"] = first, last
+
+        series = {}
+        for ts, device, count in rows:
+            entry = series.setdefault(device, {"first": 0, "last": 0, "peak": 0})
+            if ts == first:
+                entry["first"] = count
+            if ts == last:
+                entry["last"] = count
+            entry["peak"] = max(entry["peak"], count)
+
+        growing = [
+            (entry["last"] - entry["first"], device, entry)
+            for device, entry in series.items()
+            if entry["last"] > entry["first"]
+        ]
+        result["devices"] = [
+            {
+                "device": device,
+                "first_count": entry["first"],
+                "last_count": entry["last"],
+                "change": change,
+                "peak_count": entry["peak"],
+            }
+            for change, device, entry in heapq.nlargest(k, growing, key=lambda item: item[0])
+        ]
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            runs, first, last = self._conn.execute("SELECT COUNT(*), MIN(ts), MAX(ts) FROM runs").fetchone()
+        return {"path": self.path, "snapshots": runs, "first": first, "last": last, "interval_seconds": self.interval}
+
+
+_history: FailureHistory | None = None
+
+
+def get_failure_history() -> FailureHistory:
+    global _history
+    if _history is None:
+        _history = FailureHistory()
+    return _history
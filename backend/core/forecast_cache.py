@@ -0,0 +1,123 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import numpy as np
+from core.config import FORECAST_CACHE_PATH, FORECAST_CACHE_MAX_BYTES
+
+
+def series_fingerprint(engine, params, start, step, length, positions, values) -> str:
+    """Hash de una serie + parámetros del modelo; si no cambia, la predicción tampoco"""
+    header = json.dumps([engine, params, start, step, length], separators=(",", ":"), sort_keys=True)
+    digest = hashlib.sha256(header.encode("utf-8"))
+    digest.update(np.asarray(positions, dtype=np.int64).tobytes())
+    digest.update(np.asarray(values, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class ForecastCache:
+    """Caché de predicciones respaldada por SQLite, con expulsión LRU por tamaño"""
+
+    def __init__(self, path: str = FORECAST_CACHE_PATH, max_bytes: int = FORECAST_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS forecasts (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS forecasts_last_used ON forecasts (last_used)")
+        self._conn.commit()
+
+    def get_many(self, keys) -> dict:
+        """Devuelve {key: predicción} para las claves presentes"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        found = {}
+        now = time.time()
+        with self._lock:
+            for chunk_start in range(0, len(keys), 500):
+                chunk = keys[chunk_start:chunk_start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM forecasts WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = json.loads(value)
+                self._conn.execute(
+                    f"UPDATE forecasts SET last_used = ? WHERE key IN ({placeholders})", [now, *chunk]
+                )
+            self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: dict):
+        """Guarda {key: predicción} y expulsa las entradas menos usadas si se supera max_bytes"""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            encoded = json.dumps(value, separators=(",", ":"))
+            rows.append((key, encoded, len(encoded), now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO forecasts (key, value, size, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM forecasts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM forecasts ORDER BY last_used ASC"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM forecasts WHERE key = ?", victims)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM forecasts")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM forecasts"
+            ).fetchone()
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_cache: ForecastCache | None = None
+
+
+def get_forecast_cache() -> ForecastCache:
+    global _cache
+    if _cache is None:
+        _cache = ForecastCache()
+    return _cache
@@ -0,0 +1,233 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from core.config import FORECAST_WORKERS, FORECAST_ENGINE, FORECAST_SEASON_LENGTH
+from core.forecast_cache import get_forecast_cache, series_fingerprint
+
+# Número de puntos que se agregan al final de cada serie
+PREDICTION_STEPS = 36
+
+ENGINES = ("prophet", "holtwinters", "linear")
+
+# Prophet predice en pasos de 30 días; holtwinters y linear en pasos de meta.step
+PROPHET_FREQ = "30D"
+PROPHET_STEP_SECONDS = 30 * 24 * 3600
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def get_forecast_executor() -> ProcessPoolExecutor:
+    """Pool de procesos para el ajuste de modelos (CPU-bound)"""
+    global _executor
+    if _executor is None:
+        # 'spawn' evita heredar los hilos del event loop / pool de Supabase al hacer fork
+        _executor = ProcessPoolExecutor(
+            max_workers=FORECAST_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_forecast_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+
+
+def prophet_forecast(idx, positions, values, start, step, steps=PREDICTION_STEPS):
+    """Ajusta Prophet sobre una serie y devuelve (idx, valores_predichos).
+
+    Se ejecuta dentro de un proceso del pool, por eso los imports van aquí.
+    """
+    import numpy as np
+    import pandas as pd
+    from prophet import Prophet
+
+    origin = datetime.fromtimestamp(start)
+    dates = origin + pd.to_timedelta(np.asarray(positions) * step, unit="s")
+
+    df = pd.DataFrame({'ds': dates, 'y': values})
+    model = Prophet(daily_seasonality=True)
+    model.fit(df)
+    future = model.make_future_dataframe(periods=steps, freq=PROPHET_FREQ)
+    forecast = model.predict(future)
+    return idx, forecast.tail(steps)['yhat'].tolist()
+
+
+def holtwinters_forecast(idx, positions, values, start, step, steps=PREDICTION_STEPS):
+    """Holt-Winters aditivo; la estacionalidad solo se usa si hay al menos dos ciclos"""
+    import numpy as np
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+    season = FORECAST_SEASON_LENGTH
+    seasonal = "add" if season > 1 and len(values) >= 2 * season else None
+    model = ExponentialSmoothing(
+        np.asarray(values, dtype=float),
+        trend="add",
+        seasonal=seasonal,
+        seasonal_periods=season if seasonal else None,
+        initialization_method="estimated",
+    ).fit()
+    return idx, model.forecast(steps).tolist()
+
+
+def linear_forecast_batch(matrix, season=FORECAST_SEASON_LENGTH, steps=PREDICTION_STEPS):
+    """Tendencia lineal + componente estacional ingenua para todas las series a la vez.
+
+    `matrix` es (n_series, n_pasos) con NaN en los huecos. Devuelve (n_series, steps).
+    """
+    import numpy as np
+
+    y = np.asarray(matrix, dtype=float)
+    n_series, n_steps = y.shape
+    t = np.arange(n_steps, dtype=float)
+    mask = ~np.isnan(y)
+    count = mask.sum(axis=1)
+    safe_count = np.maximum(count, 1)
+
+    # Mínimos cuadrados por fila, ignorando NaN
+    t_masked = np.where(mask, t, 0.0)
+    y_masked = np.where(mask, y, 0.0)
+    t_mean = t_masked.sum(axis=1) / safe_count
+    y_mean = y_masked.sum(axis=1) / safe_count
+    t_dev = np.where(mask, t - t_mean[:, None], 0.0)
+    var_t = (t_dev ** 2).sum(axis=1)
+    slope = np.divide(
+        (t_dev * (y_masked - y_mean[:, None])).sum(axis=1),
+        var_t,
+        out=np.zeros(n_series),
+        where=var_t > 0,
+    )
+    intercept = y_mean - slope * t_mean
+
+    future_t = np.arange(n_steps, n_steps + steps, dtype=float)
+    forecast = intercept[:, None] + slope[:, None] * future_t[None, :]
+
+    # Componente estacional: media del residuo por fase del ciclo
+    if season > 1 and n_steps >= 2 * season:
+        residual = np.where(mask, y - (intercept[:, None] + slope[:, None] * t[None, :]), 0.0)
+        phase = np.arange(n_steps) % season
+        onehot = (phase[:, None] == np.arange(season)[None, :]).astype(float)
+        phase_sum = residual @ onehot
+        phase_count = mask.astype(float) @ onehot
+        seasonal = np.divide(phase_sum, phase_count, out=np.zeros_like(phase_sum), where=phase_count > 0)
+        future_phase = np.arange(n_steps, n_steps + steps) % season
+        forecast = forecast + seasonal[:, future_phase]
+
+    return forecast
+
+
+def _linear_batch(indices, positions_list, values_list, length, steps=PREDICTION_STEPS):
+    import numpy as np
+
+    matrix = np.full((len(indices), length), np.nan)
+    for row, (positions, values) in enumerate(zip(positions_list, values_list)):
+        matrix[row, positions] = values
+    forecast = linear_forecast_batch(matrix, steps=steps)
+    return {idx: forecast[row].tolist() for row, idx in enumerate(indices)}
+
+
+_PER_SERIES = {
+    "prophet": prophet_forecast,
+    "holtwinters": holtwinters_forecast,
+}
+
+
+def _engine_params(engine, steps=PREDICTION_STEPS) -> dict:
+    """Parámetros que afectan al resultado de cada motor (forman parte de la clave de caché)"""
+    if engine == "prophet":
+        return {"daily_seasonality": True, "freq": PROPHET_FREQ, "steps": steps}
+    return {"season": FORECAST_SEASON_LENGTH, "steps": steps}
+
+
+def forecast_step_seconds(engine, step) -> int:
+    """Segundos entre dos puntos predichos por `engine` (step es meta.step del gráfico)"""
+    engine = (engine or FORECAST_ENGINE).lower()
+    return PROPHET_STEP_SECONDS if engine == "prophet" else int(step)
+
+
+async def _run_engine(engine, series, start, step, length, steps=PREDICTION_STEPS, advance=None):
+    loop = asyncio.get_running_loop()
+    executor = get_forecast_executor()
+
+    if engine == "linear":
+        results = await loop.run_in_executor(
+            executor,
+            _linear_batch,
+            [idx for idx, _, _ in series],
+            [positions for _, positions, _ in series],
+            [values for _, _, values in series],
+            length,
+            steps,
+        )
+        if advance is not None:
+            advance(len(series))
+        return results
+
+    fit = _PER_SERIES[engine]
+    tasks = [
+        loop.run_in_executor(executor, fit, idx, positions, values, start, step, steps)
+        for idx, positions, values in series
+    ]
+    if advance is not None:
+        for task in tasks:
+            task.add_done_callback(lambda _: advance(1))
+
+    results = {}
+    for (idx, _, _), outcome in zip(series, await asyncio.gather(*tasks, return_exceptions=True)):
+        if isinstance(outcome, BaseException):
+            print(f"Failed to predict using {engine} for index {idx}: {str(outcome)}")
+            continue
+        results[idx] = outcome[1]
+    return results
+
+
+async def forecast_series(series, start, step, length, engine=None, use_cache=True, steps=PREDICTION_STEPS, progress=None):
+    """Predice una lista de series [(idx, posiciones, valores), ...].
+
+    `posiciones` son los índices de paso (respecto a `start`) de cada valor y
+    `length` el número total de pasos del gráfico original.
+    prophet y holtwinters ajustan cada serie en paralelo en el pool de procesos;
+    linear resuelve todas las series en una sola operación matricial.
+    Las series cuya huella ya está en la caché no se vuelven a ajustar.
+    `progress(hechas, total)` se llama cada vez que termina una serie.
+    Devuelve {idx: valores_predichos}; las series que fallan se omiten.
+    """
+    engine = (engine or FORECAST_ENGINE).lower()
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown forecasting engine '{engine}'. Valid engines: {', '.join(ENGINES)}")
+    if not series:
+        return {}
+
+    total = len(series)
+    done = 0
+
+    def advance(count):
+        nonlocal done
+        done += count
+        if progress is not None:
+            progress(done, total)
+
+    if not use_cache:
+        return await _run_engine(engine, series, start, step, length, steps, advance)
+
+    cache = get_forecast_cache()
+    params = _engine_params(engine, steps)
+    keys = {
+        idx: series_fingerprint(engine, params, start, step, length, positions, values)
+        for idx, positions, values in series
+    }
+    cached = cache.get_many(keys.values())
+
+    results = {idx: cached[key] for idx, key in keys.items() if key in cached}
+    pending = [item for item in series if item[0] not in results]
+    print(f"♻️ Predicciones ({engine}): {len(results)} reutilizadas de caché, {len(pending)} por ajustar")
+    advance(len(results))
+
+    if pending:
+        fitted = await _run_engine(engine, pending, start, step, length, steps, advance)
+        cache.put_many({keys[idx]: values for idx, values in fitted.items()})
+        results.update(fitted)
+    return results
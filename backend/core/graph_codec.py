@@ -0,0 +1,63 @@
+import base64
+import zlib
+import numpy as np
+from core.timeseries import graph_matrix
+
+# Identificador del formato guardado en la columna `response`
+GRAPH_ENCODING = "zlib-shuffle-f64-v1"
+
+
+def _pack(matrix: np.ndarray) -> str:
+    """float64 columna a columna, con los bytes agrupados por posición (shuffle) y zlib.
+
+    Agrupar los bytes de igual peso deja juntos exponentes y bytes altos, que se
+    repiten mucho entre muestras consecutivas, y zlib comprime bastante mejor.
+    """
+    columnar = np.ascontiguousarray(matrix.T, dtype="<f8")
+    shuffled = columnar.view(np.uint8).reshape(-1, 8).T.tobytes()
+    return base64.b64encode(zlib.compress(shuffled, 6)).decode("ascii")
+
+
+def _unpack(payload: str, rows: int, width: int) -> np.ndarray:
+    raw = np.frombuffer(zlib.decompress(base64.b64decode(payload)), dtype=np.uint8)
+    columnar = raw.reshape(8, -1).T.copy().view("<f8").reshape(width, rows)
+    return columnar.T
+
+
+def is_encoded(stored) -> bool:
+    return isinstance(stored, dict) and stored.get("encoding") == GRAPH_ENCODING
+
+
+def encode_graph(graph_data: dict) -> dict:
+    """Codifica un gráfico (meta + data) como meta JSON + matriz float64 comprimida.
+
+    Los None y las filas incompletas quedan como NaN; al decodificar todas las
+    filas vuelven con el ancho de la leyenda.
+    """
+    matrix, _ = graph_matrix(graph_data)
+    rows, width = matrix.shape
+    return {
+        "encoding": GRAPH_ENCODING,
+        "meta": graph_data["meta"],
+        "shape": [rows, width],
+        "data": _pack(matrix),
+    }
+
+
+def decode_matrix(stored: dict):
+    """(meta, matriz n_pasos x n_leyenda) de un snapshot, codificado o JSON plano"""
+    if not is_encoded(stored):
+        matrix, _ = graph_matrix(stored)
+        return stored["meta"], matrix
+    rows, width = stored["shape"]
+    return stored["meta"], _unpack(stored["data"], rows, width)
+
+
+def decode_graph(stored: dict) -> dict:
+    """Devuelve el gráfico con la forma original {meta, data}; las filas JSON antiguas pasan tal cual"""
+    if not is_encoded(stored):
+        return stored
+    meta, matrix = decode_matrix(stored)
+    values = matrix.astype(object)
+    values[np.isnan(matrix)] = None
+    return {"meta": meta, "data": values.tolist()}
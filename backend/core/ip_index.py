@@ -0,0 +1,134 @@
+import ipaddress
+import json
+from core.config import CORE_PREFIXES_PATH
+
+
+def expand_prefix(text: str) -> list[ipaddress.IPv4Network]:
+    """Convierte un prefijo de la tabla de cores en redes CIDR.
+
+    Acepta notación CIDR ("172.31.0.0/16") o prefijos de texto como los que usa
+    el frontend: "172.31." equivale a 172.31.0.0/16 y "172.31.1." a
+    172.31.1.0/24, mientras que "172.31.1" (sin punto final) también cubre
+    los octetos 10-19 y 100-199, igual que un startsWith sobre la IP.
+    """
+    text = text.strip()
+    if "/" in text:
+        return [ipaddress.IPv4Network(text, strict=False)]
+
+    parts = text.split(".")
+    complete = [int(part) for part in parts[:-1]]
+    last = parts[-1]
+    if last == "":
+        return [_network(complete)]
+
+    networks = []
+    for octet in range(256):
+        if str(octet).startswith(last):
+            networks.append(_network(complete + [octet]))
+    return networks
+
+
+def _network(octets: list[int]) -> ipaddress.IPv4Network:
+    prefix_len = 8 * len(octets)
+    padded = octets + [0] * (4 - len(octets))
+    return ipaddress.IPv4Network((".".join(map(str, padded)), prefix_len))
+
+
+class PrefixIndex:
+    """Trie binario (radix) de prefijos IPv4 para búsquedas por prefijo más largo"""
+
+    def __init__(self):
+        self._root: list = [None, None, None]  # [hijo_0, hijo_1, (valor, peso)]
+        self.size = 0
+
+    def insert(self, network: ipaddress.IPv4Network, value, weight: int = 0):
+        """Inserta una red; con el mismo prefijo gana el de mayor `weight` (o el último)"""
+        node = self._root
+        bits = int(network.network_address)
+        for i in range(network.prefixlen):
+            bit = (bits >> (31 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        if node[2] is None:
+            self.size += 1
+        elif node[2][1] > weight:
+            return
+        node[2] = (value, weight)
+
+    def lookup(self, ip: str):
+        """Valor asociado al prefijo más largo que contiene la IP (None si no hay)"""
+        try:
+            bits = int(ipaddress.IPv4Address(ip.strip()))
+        except (ipaddress.AddressValueError, ValueError):
+            return None
+        node = self._root
+        best = node[2]
+        for i in range(32):
+            node = node[(bits >> (31 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                best = node[2]
+        return best[0] if best is not None else None
+
+    def lookup_many(self, ips) -> dict:
+        return {ip: self.lookup(ip) for ip in dict.fromkeys(ips)}
+
+
+class CoreIndex:
+    """Índice IP -> core cargado desde la tabla de prefijos (data/core_prefixes.json).
+
+    Un mismo prefijo asignado a dos cores distintos es un error de la tabla:
+    en lugar de quedarse con uno en silencio, la carga falla.
+    """
+
+    def __init__(self, entries: list[dict]):
+        self.entries = entries
+        self.index = PrefixIndex()
+        assigned = {}
+        conflicts = {}
+        for entry in entries:
+            prefix, core = entry["prefix"], entry["core"]
+            if prefix in assigned and assigned[prefix] != core:
+                conflicts.setdefault(prefix, [assigned[prefix]]).append(core)
+            assigned[prefix] = core
+        if conflicts:
+            raise ValueError(f"Prefixes assigned to more than one core: {conflicts}")
+
+        for prefix, core in assigned.items():
+            # A igual longitud de red, gana el prefijo de texto más específico
+            for network in expand_prefix(prefix):
+                self.index.insert(network, core, weight=len(prefix))
+
+    def cores(self) -> list[str]:
+        """IPs de los cores, sin repetir y en el orden de la tabla"""
+        return list(dict.fromkeys(entry["core"] for entry in self.entries))
+
+    def lookup(self, ip: str):
+        return self.index.lookup(ip)
+
+    def lookup_many(self, ips) -> dict:
+        return self.index.lookup_many(ips)
+
+
+def load_core_index(path: str = CORE_PREFIXES_PATH) -> CoreIndex:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return CoreIndex(data.get("prefixes", []))
+
+
+_core_index: CoreIndex | None = None
+
+
+def get_core_index() -> CoreIndex:
+    global _core_index
+    if _core_index is None:
+        _core_index = load_core_index()
+    return _core_index
+
+
+def reload_core_index() -> CoreIndex:
+    global _core_index
+    _core_index = load_core_index()
+    return _core_index
@@ -0,0 +1,107 @@
+import time
+from collections import deque
+from core.config import JOB_HISTORY_SIZE
+from core.observium import track_requests
+
+OK = "ok"
+PARTIAL = "partial"
+ERROR = "error"
+SKIPPED = "skipped"
+
+
+class JobTelemetry:
+    """Historial de ejecuciones de los jobs programados: duración, llamadas a Observium y resultado"""
+
+    def __init__(self, history_size: int = JOB_HISTORY_SIZE):
+        self.history_size = history_size
+        self.runs: dict[str, deque] = {}
+        self.running: dict[str, float] = {}
+        self.scheduler = None
+
+    def _record(self, name: str, run: dict):
+        self.runs.setdefault(name, deque(maxlen=self.history_size)).append(run)
+
+    async def run(self, name: str, func, *args, **kwargs):
+        """Ejecuta `func` registrando la ejecución; si ya hay una en curso se omite.
+
+        Si `func` devuelve un dict con "stages", el resultado es "partial" cuando
+        alguna etapa falló.
+        """
+        started = time.time()
+        if name in self.running:
+            self._record(name, {"started_at": started, "duration_seconds": 0.0, "outcome": SKIPPED,
+                                "error": "Previous run still in progress", "upstream_requests": 0, "upstream_errors": 0})
+            print(f"⏭️ Job {name} omitido: la ejecución anterior sigue en curso")
+            return None
+
+        self.running[name] = started
+        perf_started = time.perf_counter()
+        outcome, error, result = OK, None, None
+        with track_requests() as counter:
+            try:
+                result = await func(*args, **kwargs)
+                stages = result.get("stages") if isinstance(result, dict) else None
+                if stages and any(stage.get("outcome") == ERROR for stage in stages.values()):
+                    outcome = PARTIAL
+            except Exception as e:
+                outcome, error = ERROR, str(e) or e.__class__.__name__
+            finally:
+                self.running.pop(name, None)
+
+        run = {
+            "started_at": started,
+            "duration_seconds": round(time.perf_counter() - perf_started, 3),
+            "outcome": outcome,
+            "error": error,
+            "upstream_requests": counter["requests"],
+            "upstream_errors": counter["errors"],
+        }
+        if isinstance(result, dict) and "stages" in result:
+            run["stages"] = result["stages"]
+        self._record(name, run)
+
+        icon = "✅" if outcome == OK else "⚠️" if outcome == PARTIAL else "❌"
+        print(f"{icon} Job {name}: {outcome} en {run['duration_seconds']}s, {counter['requests']} llamadas a Observium"
+              + (f" ({error})" if error else ""))
+        return result
+
+    def summary(self, name: str) -> dict:
+        runs = list(self.runs.get(name, []))
+        executed = [run for run in runs if run["outcome"] != SKIPPED]
+        job = self.scheduler.get_job(name) if self.scheduler is not None else None
+        next_run = getattr(job, "next_run_time", None) if job is not None else None
+        return {
+            "job": name,
+            "running_since": self.running.get(name),
+            "next_run_time": next_run.isoformat() if next_run else None,
+            "runs": len(runs),
+            "outcomes": {outcome: sum(1 for run in runs if run["outcome"] == outcome) for outcome in (OK, PARTIAL, ERROR, SKIPPED)},
+            "avg_duration_seconds": round(sum(run["duration_seconds"] for run in executed) / len(executed), 3) if executed else None,
+            "upstream_requests": sum(run["upstream_requests"] for run in runs),
+            "last_run": runs[-1] if runs else None,
+        }
+
+    def stats(self) -> list:
+        names = set(self.runs) | set(self.running)
+        if self.scheduler is not None:
+            names |= {job.id for job in self.scheduler.get_jobs()}
+        return [self.summary(name) for name in sorted(names)]
+
+    def history(self, name: str) -> list:
+        return list(self.runs.get(name, []))
+
+
+job_telemetry = JobTelemetry()
+
+
+async def run_stage(stages: dict, name: str, func, *args, **kwargs):
+    """Ejecuta una etapa de un pipeline y guarda su duración y resultado en `stages`"""
+    started = time.perf_counter()
+    try:
+        result = await func(*args, **kwargs)
+        stages[name] = {"outcome": OK, "duration_seconds": round(time.perf_counter() - started, 3)}
+        return result
+    except Exception as e:
+        stages[name] = {"outcome": ERROR, "duration_seconds": round(time.perf_counter() - started, 3),
+                        "error": str(e) or e.__class__.__name__}
+        return None
@@ -0,0 +1,114 @@
+import asyncio
+import time
+import uuid
+from core.config import JOB_RESULT_TTL, JOB_MAX_FINISHED
+from core.encoded_body import EncodedBody
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """Trabajo en segundo plano con progreso (hechas / total) y su resultado"""
+
+    def __init__(self, key: tuple, params: dict):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.params = params
+        self.status = QUEUED
+        self.done = 0
+        self.total = None
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.task: asyncio.Task | None = None
+        self._body: EncodedBody | None = None
+
+    def progress(self, done: int, total: int):
+        self.done = done
+        self.total = total
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def body(self) -> EncodedBody:
+        """Resultado serializado y comprimido una sola vez"""
+        if self._body is None:
+            self._body = EncodedBody.from_value(self.result)
+        return self._body
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "progress": {"done": self.done, "total": self.total},
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round((self.finished_at or time.time()) - (self.started_at or self.created_at), 3),
+        }
+
+
+class JobRegistry:
+    """Jobs en memoria del proceso; un job idéntico en curso se reutiliza en lugar de lanzar otro.
+
+    `run(job)` es la corrutina que hace el trabajo; debe devolver el resultado e
+    ir llamando a job.progress(hechas, total).
+    """
+
+    def __init__(self, run, ttl: float = JOB_RESULT_TTL, max_finished: int = JOB_MAX_FINISHED):
+        self.run = run
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.jobs: dict[str, Job] = {}
+
+    def submit(self, params: dict) -> tuple[Job, bool]:
+        """Devuelve (job, creado); si ya hay uno igual sin terminar se devuelve ese"""
+        self._prune()
+        key = tuple(sorted(params.items()))
+        for job in self.jobs.values():
+            if job.key == key and not job.finished:
+                return job, False
+
+        job = Job(key, params)
+        self.jobs[job.id] = job
+        job.task = asyncio.ensure_future(self._execute(job))
+        return job, True
+
+    async def _execute(self, job: Job):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = await self.run(job)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e) or e.__class__.__name__
+            job.status = FAILED
+            print(f"❌ Job {job.id} falló: {job.error}")
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def list(self) -> list:
+        return [job.to_dict() for job in sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)]
+
+    def _prune(self):
+        """Descarta jobs terminados caducados y, si sobran, los más antiguos"""
+        now = time.time()
+        finished = sorted(
+            (job for job in self.jobs.values() if job.finished),
+            key=lambda job: job.finished_at,
+        )
+        expired = [job for job in finished if now - job.finished_at > self.ttl]
+        extra = finished[:max(0, len(finished) - self.max_finished)]
+        for job in expired + extra:
+            self.jobs.pop(job.id, None)
@@ -0,0 +1,151 @@
+import json
+import re
+
+_WS = re.compile(r"[ \t\n\r]*")
+
+
+class ObjectItemStream:
+    """Parser incremental para respuestas del tipo {"status": ..., "<key>": {id: {...}, ...}}.
+
+    Se alimenta con trozos de texto (feed) y devuelve los pares (id, objeto) de
+    `key` a medida que se completan, sin construir nunca el documento entero.
+    Los demás campos de primer nivel (status, count, ...) quedan en `extra`.
+    Si `key` trae una lista en lugar de un objeto, los ids son None.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.extra = {}
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._current_key = None
+        self._decoder = json.JSONDecoder()
+
+    def _skip_ws(self):
+        self._pos = _WS.match(self._buf, self._pos).end()
+
+    def _decode(self, pos: int, final: bool):
+        """raw_decode que distingue 'faltan datos' (None) de un valor completo"""
+        try:
+            value, end = self._decoder.raw_decode(self._buf, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None
+        # Un número al final del buffer podría seguir en el próximo trozo
+        if end == len(self._buf) and not final and not isinstance(value, (dict, list, str)):
+            return None
+        return value, end
+
+    def _key_value(self, final: bool):
+        """Lee `"clave": valor` desde la posición actual; None si el buffer no alcanza"""
+        decoded = self._decode(self._pos, final)
+        if decoded is None:
+            return None
+        key, end = decoded
+        colon = _WS.match(self._buf, end).end()
+        if colon >= len(self._buf):
+            return None
+        if self._buf[colon] != ":":
+            raise ValueError(f"Expected ':' after key {key!r}")
+        value_start = _WS.match(self._buf, colon + 1).end()
+        if value_start >= len(self._buf):
+            return None
+        return key, value_start
+
+    def feed(self, text: str, final: bool = False) -> list:
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        items = []
+
+        while True:
+            self._skip_ws()
+            if self._pos >= len(self._buf):
+                break
+            char = self._buf[self._pos]
+            state = self._state
+
+            if state == "start":
+                if char != "{":
+                    raise ValueError("Expected a JSON object")
+                self._pos += 1
+                self._state = "top"
+
+            elif state == "top":
+                if char == "}":
+                    self._pos += 1
+                    self._state = "end"
+                    continue
+                if char == ",":
+                    self._pos += 1
+                    continue
+                found = self._key_value(final)
+                if found is None:
+                    break
+                self._current_key, self._pos = found
+                self._state = "target" if self._current_key == self.key else "top_value"
+
+            elif state == "top_value":
+                decoded = self._decode(self._pos, final)
+                if decoded is None:
+                    break
+                self.extra[self._current_key], self._pos = decoded
+                self._state = "top"
+
+            elif state == "target":
+                if char == "{":
+                    self._pos += 1
+                    self._state = "members"
+                elif char == "[":
+                    self._pos += 1
+                    self._state = "elements"
+                else:
+                    self._state = "top_value"
+
+            elif state == "members":
+                if char == "}":
+                    self._pos += 1
+                    self._state = "top"
+                    continue
+                if char == ",":
+                    self._pos += 1
+                    continue
+                start = self._pos
+                found = self._key_value(final)
+                if found is None:
+                    break
+                item_key, value_start = found
+                decoded = self._decode(value_start, final)
+                if decoded is None:
+                    self._pos = start
+                    break
+                value, self._pos = decoded
+                items.append((item_key, value))
+
+            elif state == "elements":
+                if char == "]":
+                    self._pos += 1
+                    self._state = "top"
+                    continue
+                if char == ",":
+                    self._pos += 1
+                    continue
+                decoded = self._decode(self._pos, final)
+                if decoded is None:
+                    break
+                value, self._pos = decoded
+                items.append((None, value))
+
+            else:
+                # Contenido después del objeto principal: se ignora
+                self._pos = len(self._buf)
+
+        return items
+
+    def close(self) -> list:
+        """Procesa lo que quede en el buffer; falla si el JSON quedó incompleto"""
+        items = self.feed("", final=True)
+        if self._state != "end":
+            raise ValueError("Incomplete JSON document")
+        return items
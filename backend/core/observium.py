@@ -0,0 +1,163 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+import httpx
+from core.config import (
+    OBS_USER,
+    OBS_PASS,
+    OBSERVIUM_MAX_CONNECTIONS,
+    OBSERVIUM_MAX_KEEPALIVE,
+    OBSERVIUM_KEEPALIVE_EXPIRY,
+    OBSERVIUM_CONNECT_TIMEOUT,
+    OBSERVIUM_READ_TIMEOUT,
+    OBSERVIUM_POOL_TIMEOUT,
+    OBSERVIUM_HTTP2,
+)
+
+# Cliente HTTP único hacia Observium, creado en el lifespan de main.py
+_client: httpx.AsyncClient | None = None
+_stats = {
+    "requests": 0,
+    "errors": 0,
+    "responses": 0,
+    "total_elapsed": 0.0,
+    "created_at": None,
+    "http2": False,
+}
+
+
+# Contador de la ejecución en curso (job programado); las tareas hijas heredan el contexto
+_run_counter: ContextVar[dict | None] = ContextVar("observium_run_counter", default=None)
+
+
+@contextmanager
+def track_requests():
+    """Cuenta las peticiones a Observium hechas dentro del bloque (y de las tareas que lance)"""
+    counter = {"requests": 0, "errors": 0}
+    token = _run_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _run_counter.reset(token)
+
+
+def _count_error():
+    _stats["errors"] += 1
+    counter = _run_counter.get()
+    if counter is not None:
+        counter["errors"] += 1
+
+
+class _CountingTransport(httpx.AsyncBaseTransport):
+    """Envuelve el transporte del pool para contar peticiones, errores y latencia.
+
+    Los fallos de transporte (timeouts, errores de conexión, pool agotado) no
+    llegan a producir respuesta, así que se cuentan aquí como errores; la
+    latencia solo suma las peticiones que sí obtuvieron respuesta.
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport):
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        _stats["requests"] += 1
+        counter = _run_counter.get()
+        if counter is not None:
+            counter["requests"] += 1
+
+        started = time.perf_counter()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except httpx.TransportError:
+            _count_error()
+            raise
+        _stats["total_elapsed"] += time.perf_counter() - started
+        _stats["responses"] += 1
+        if response.status_code >= 400:
+            _count_error()
+        return response
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = OBSERVIUM_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("⚠️ OBSERVIUM_HTTP2 activado pero el paquete 'h2' no está instalado; se usa HTTP/1.1")
+            http2 = False
+    _stats["http2"] = http2
+
+    transport = httpx.AsyncHTTPTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=OBSERVIUM_MAX_CONNECTIONS,
+            max_keepalive_connections=OBSERVIUM_MAX_KEEPALIVE,
+            keepalive_expiry=OBSERVIUM_KEEPALIVE_EXPIRY,
+        ),
+    )
+    return httpx.AsyncClient(
+        auth=(OBS_USER, OBS_PASS),
+        transport=_CountingTransport(transport),
+        timeout=httpx.Timeout(
+            OBSERVIUM_READ_TIMEOUT,
+            connect=OBSERVIUM_CONNECT_TIMEOUT,
+            pool=OBSERVIUM_POOL_TIMEOUT,
+        ),
+    )
+
+
+async def start_observium_client():
+    """Crea el cliente compartido (llamado desde el lifespan)"""
+    return get_observium_client()
+
+
+async def close_observium_client():
+    """Cierra el cliente compartido y libera las conexiones del pool"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def get_observium_client() -> httpx.AsyncClient:
+    """Devuelve el cliente compartido, creándolo si todavía no existe (p.ej. fuera del lifespan)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+        _stats["created_at"] = time.time()
+    return _client
+
+
+def get_pool_stats() -> dict:
+    """Estadísticas del pool de conexiones y de las peticiones realizadas"""
+    connections = []
+    if _client is not None and not _client.is_closed:
+        transport = getattr(_client._transport, "inner", _client._transport)
+        pool = getattr(transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+
+    idle = sum(1 for conn in connections if conn.is_idle())
+    requests = _stats["requests"]
+    responses = _stats["responses"]
+    return {
+        "active": _client is not None and not _client.is_closed,
+        "http2": _stats["http2"],
+        "limits": {
+            "max_connections": OBSERVIUM_MAX_CONNECTIONS,
+            "max_keepalive_connections": OBSERVIUM_MAX_KEEPALIVE,
+            "keepalive_expiry": OBSERVIUM_KEEPALIVE_EXPIRY,
+        },
+        "connections": {
+            "total": len(connections),
+            "idle": idle,
+            "in_use": len(connections) - idle,
+        },
+        "requests": requests,
+        "errors": _stats["errors"],
+        "avg_latency_ms": round(_stats["total_elapsed"] / responses * 1000, 2) if responses else None,
+        "created_at": _stats["created_at"],
+    }
@@ -0,0 +1,262 @@
+import asyncio
+import codecs
+import heapq
+import os
+import time
+from collections import defaultdict
+import numpy as np
+from core.config import OBSERVIUM_API_BASE, PORT_SNAPSHOT_TTL
+from core.observium import get_observium_client
+from core.json_stream import ObjectItemStream
+from core.port_table import PortTableBuilder, PortTable, parse_counter
+from core.device_cache import device_inventory
+from core.counter_history import get_counter_history
+from core.failure_history import get_failure_history
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):  # Windows
+    _PAGE_SIZE = None
+
+# Cada cuántos bytes recibidos se vuelve a medir el RSS durante la descarga
+_RSS_SAMPLE_BYTES = 4 * 1024 ** 2
+
+# port_descr_type de los puertos de borde a internet y de los de tránsito
+INTERNET_TYPE = "peering"
+NON_INTERNET_TYPE = "transit"
+
+
+def _current_rss_mb() -> float | None:
+    """RSS actual del proceso en MB (de /proc; None donde no existe).
+
+    No se usa ru_maxrss porque es el máximo de toda la vida del proceso y no
+    reflejaría lo que consume cada refresco.
+    """
+    if _PAGE_SIZE is None:
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(resident_pages * _PAGE_SIZE / 1024 ** 2, 1)
+
+
+def consumption_summary(total_in: int, total_out: int) -> dict:
+    return {
+        "total_in_octets": total_in,
+        "total_out_octets": total_out,
+        "total_combined_octets": total_in + total_out,
+        "total_in_gb": round(total_in / (1024 ** 3), 2),
+        "total_out_gb": round(total_out / (1024 ** 3), 2),
+        "total_combined_gb": round((total_in + total_out) / (1024 ** 3), 2)
+    }
+
+
+def port_state(port: dict) -> str:
+    """Estado del puerto con el mismo criterio que el filtro state= de Observium"""
+    if port.get("ifAdminStatus") == "down":
+        return "disabled"
+    if port.get("ifOperStatus") in ("down", "lowerLayerDown"):
+        return "down"
+    return "up"
+
+
+class PortAggregates:
+    """Agregados de un listado de puertos, calculados en una sola pasada"""
+
+    def __init__(self):
+        self.total_in = 0
+        self.total_out = 0
+        self.count = 0
+        self.by_type = defaultdict(lambda: {"in": 0, "out": 0, "count": 0})
+        # Fallas: solo conteos por dispositivo y un byte por puerto que marca si
+        # está caído; las filas y etiquetas se sacan de la tabla solo con details
+        self.failure_counts = defaultdict(int)
+        self.failed = bytearray()
+        self.transit_ports = {}
+        self.table_builder = PortTableBuilder()
+        self.table: PortTable | None = None
+
+    def add(self, port_id, port: dict):
+        port_id = str(port.get("port_id", port_id))
+        descr_type = port.get("port_descr_type") or ""
+        state = port_state(port)
+        device = port.get("sysName") or port.get("hostname") or "Unknown"
+
+        self.count += 1
+
+        # Mismo criterio que PortTable: cada contador por separado, 0 si no es válido
+        octets_in = parse_counter(port.get("ifInOctets"))
+        octets_out = parse_counter(port.get("ifOutOctets"))
+        self.total_in += octets_in
+        self.total_out += octets_out
+        bucket = self.by_type[descr_type]
+        bucket["in"] += octets_in
+        bucket["out"] += octets_out
+        bucket["count"] += 1
+
+        self.table_builder.add(port, device, descr_type, state)
+
+        if descr_type == NON_INTERNET_TYPE:
+            self.transit_ports[port_id] = port
+
+        # Igual que /ports/?state=down&ignore=0
+        failed = state == "down" and str(port.get("ignore", "0")) == "0"
+        self.failed.append(failed)
+        if failed:
+            self.failure_counts[device] += 1
+
+    def consumption(self, descr_type: str | None = None) -> dict:
+        if descr_type is None:
+            return consumption_summary(self.total_in, self.total_out)
+        bucket = self.by_type.get(descr_type, {"in": 0, "out": 0})
+        return consumption_summary(bucket["in"], bucket["out"])
+
+    def top_failures(self, k: int = 5, details: bool = True) -> list:
+        """Los k dispositivos con más puertos caídos (heap de tamaño k, sin ordenar todo).
+
+        Con details=True se agregan las etiquetas de los puertos, solo para esos k.
+        """
+        top = heapq.nlargest(k, self.failure_counts.items(), key=lambda item: item[1])
+        if not details:
+            return [{"device": device, "fail_count": count} for device, count in top]
+
+        rows_by_device = self._failure_rows([device for device, _ in top])
+        return [
+            {"device": device, "fail_count": count, "ports": rows_by_device.get(device, [])}
+            for device, count in top
+        ]
+
+    def _failure_rows(self, devices: list) -> dict:
+        """Etiquetas de los puertos caídos de `devices`, buscadas en la tabla columnar"""
+        if self.table is None or not devices:
+            return {}
+        failed = np.frombuffer(self.failed, dtype=np.bool_)[: len(self.table)]
+        codes = self.table.codes["device"][: len(failed)]
+        code_of = {label: code for code, label in enumerate(self.table.labels["device"])}
+        labels = self.table.port_labels
+        result = {}
+        for device in devices:
+            code = code_of.get(device)
+            if code is None:
+                continue
+            rows = np.flatnonzero(failed & (codes == code))
+            result[device] = [labels[row] for row in rows.tolist()]
+        return result
+
+
+class PortSnapshot:
+    """Snapshot en memoria de /ports, refrescado periódicamente.
+
+    Todos los endpoints de consumo y fallas leen los agregados precalculados en
+    lugar de descargar cada uno el listado completo de Observium.
+    """
+
+    def __init__(self, ttl: float = PORT_SNAPSHOT_TTL):
+        self.ttl = ttl
+        self.aggregates: PortAggregates | None = None
+        self.table: PortTable | None = None
+        self.fetched_at: float | None = None
+        self.refresh_seconds: float | None = None
+        self.bytes_received: int | None = None
+        self.rss_peak_mb: float | None = None
+        self.rss_growth_mb: float | None = None
+        self._inflight: asyncio.Task | None = None
+
+    def is_fresh(self) -> bool:
+        return self.fetched_at is not None and time.time() - self.fetched_at < self.ttl
+
+    async def get(self) -> PortAggregates:
+        """Agregados vigentes; si caducaron se refrescan (una sola descarga a la vez)"""
+        if self.aggregates is not None and self.is_fresh():
+            return self.aggregates
+        return await self.refresh()
+
+    async def refresh(self) -> PortAggregates:
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._load())
+            self._inflight.add_done_callback(lambda _: setattr(self, "_inflight", None))
+        return await asyncio.shield(self._inflight)
+
+    async def _load(self) -> PortAggregates:
+        """Descarga /ports en streaming y va acumulando los agregados puerto a puerto.
+
+        El JSON se parsea de forma incremental, así que nunca se materializa el
+        listado completo en memoria.
+        """
+        started = time.perf_counter()
+        rss_before = _current_rss_mb()
+        rss_peak = rss_before
+        next_sample = _RSS_SAMPLE_BYTES
+        aggregates = PortAggregates()
+        parser = ObjectItemStream("ports")
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        received = 0
+
+        client = get_observium_client()
+        async with client.stream("GET", f"{OBSERVIUM_API_BASE}/ports") as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"Failed to fetch ports (HTTP {response.status_code})")
+
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received >= next_sample:
+                    next_sample += _RSS_SAMPLE_BYTES
+                    rss_now = _current_rss_mb()
+                    if rss_now is not None and (rss_peak is None or rss_now > rss_peak):
+                        rss_peak = rss_now
+                for port_id, port in parser.feed(decoder.decode(chunk)):
+                    aggregates.add(port_id, port)
+            for port_id, port in parser.feed(decoder.decode(b"", final=True)) + parser.close():
+                aggregates.add(port_id, port)
+
+        # Tabla columnar; la ubicación sale del inventario de dispositivos
+        try:
+            inventory = await device_inventory.get_index()
+            locations = {device_id: device.get("location") for device_id, device in inventory.items()}
+        except Exception as e:
+            print(f"⚠️ Sin inventario de dispositivos para las ubicaciones de puertos: {str(e)}")
+            locations = {}
+        self.table = aggregates.table = aggregates.table_builder.build(locations)
+        aggregates.table_builder = None
+
+        self.aggregates = aggregates
+        self.fetched_at = time.time()
+        self.refresh_seconds = round(time.perf_counter() - started, 3)
+        self.bytes_received = received
+        rss_after = _current_rss_mb()
+        if rss_after is not None and (rss_peak is None or rss_after > rss_peak):
+            rss_peak = rss_after
+        self.rss_peak_mb = rss_peak
+        self.rss_growth_mb = round(rss_peak - rss_before, 1) if rss_peak is not None and rss_before is not None else None
+
+        # Cada refresco deja una muestra de contadores para calcular tasas (bps)
+        try:
+            await asyncio.to_thread(get_counter_history().append, self.fetched_at, self.table)
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar la muestra de contadores: {str(e)}")
+        try:
+            await asyncio.to_thread(get_failure_history().record, self.fetched_at, dict(aggregates.failure_counts))
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar el histórico de fallas: {str(e)}")
+
+        print(
+            f"📦 Snapshot de puertos: {aggregates.count} puertos, {received / 1024 ** 2:.1f} MB "
+            f"en {self.refresh_seconds}s, RSS pico {self.rss_peak_mb} MB (+{self.rss_growth_mb} MB sobre {rss_before} MB)"
+        )
+        return aggregates
+
+    def stats(self) -> dict:
+        return {
+            "ports": self.aggregates.count if self.aggregates else 0,
+            "fetched_at": self.fetched_at,
+            "ttl_seconds": self.ttl,
+            "refresh_seconds": self.refresh_seconds,
+            "bytes_received": self.bytes_received,
+            "rss_peak_mb": self.rss_peak_mb,
+            "rss_growth_mb": self.rss_growth_mb,
+        }
+
+
+port_snapshot = PortSnapshot()
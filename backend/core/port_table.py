@@ -0,0 +1,189 @@
+import numpy as np
+
+# Contadores numéricos que se guardan como columnas
+METRICS = ("ifInOctets", "ifOutOctets", "ifInErrors", "ifOutErrors", "ifSpeed")
+# Métricas derivadas que también se pueden agregar u ordenar
+DERIVED_METRICS = ("total_octets", "total_errors")
+GROUPS = ("device", "location", "type", "state")
+
+
+class _Categories:
+    """Codificación categórica: etiqueta -> código entero"""
+
+    def __init__(self):
+        self.labels: list[str] = []
+        self._codes: dict[str, int] = {}
+
+    def code(self, label: str) -> int:
+        code = self._codes.get(label)
+        if code is None:
+            code = len(self.labels)
+            self._codes[label] = code
+            self.labels.append(label)
+        return code
+
+
+_MAX_COUNTER = 2 ** 64 - 1
+_LOW_MASK = np.uint64(0xFFFFFFFF)
+
+
+def _int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def parse_counter(value) -> int:
+    """Contador SNMP sin signo: se acota a [0, 2^64 - 1] para que quepa en uint64"""
+    return min(max(_int(value), 0), _MAX_COUNTER)
+
+
+def _exact_group_sums(codes: np.ndarray, values: np.ndarray, size: int) -> list[int]:
+    """Suma exacta por grupo de contadores uint64, sin desbordar.
+
+    Cada valor se parte en sus 32 bits altos y bajos; cada mitad se suma por
+    separado en uint64 (no desborda por debajo de 2^32 filas) y el resultado
+    se recompone con enteros de Python, que no tienen límite.
+    """
+    low = np.zeros(size, dtype=np.uint64)
+    high = np.zeros(size, dtype=np.uint64)
+    np.add.at(low, codes, values & _LOW_MASK)
+    np.add.at(high, codes, values >> np.uint64(32))
+    return [(int(h) << 32) + int(l) for h, l in zip(high.tolist(), low.tolist())]
+
+
+class PortTableBuilder:
+    """Acumula puertos fila a fila (durante el streaming) en columnas compactas"""
+
+    def __init__(self):
+        self.port_ids: list[int] = []
+        self.labels: list[str] = []
+        self.device_ids: list[str] = []
+        self.columns = {metric: [] for metric in METRICS}
+        self.categories = {group: _Categories() for group in ("device", "type", "state")}
+        self.codes = {group: [] for group in ("device", "type", "state")}
+
+    def add(self, port: dict, device: str, descr_type: str, state: str):
+        self.port_ids.append(_int(port.get("port_id")))
+        self.labels.append(port.get("ifDescr") or port.get("port_label") or str(port.get("port_id")))
+        self.device_ids.append(str(port.get("device_id") or ""))
+        for metric in METRICS:
+            self.columns[metric].append(parse_counter(port.get(metric)))
+        self.codes["device"].append(self.categories["device"].code(device))
+        self.codes["type"].append(self.categories["type"].code(descr_type or "none"))
+        self.codes["state"].append(self.categories["state"].code(state))
+
+    def build(self, device_locations: dict | None = None) -> "PortTable":
+        """Convierte las listas en arrays; `device_locations` es {device_id: location}"""
+        device_locations = device_locations or {}
+        locations = _Categories()
+        location_codes = [
+            locations.code(device_locations.get(device_id) or "Unknown")
+            for device_id in self.device_ids
+        ]
+
+        columns = {metric: np.asarray(values, dtype=np.uint64) for metric, values in self.columns.items()}
+        codes = {group: np.asarray(values, dtype=np.int32) for group, values in self.codes.items()}
+        codes["location"] = np.asarray(location_codes, dtype=np.int32)
+        labels = {group: categories.labels for group, categories in self.categories.items()}
+        labels["location"] = locations.labels
+
+        return PortTable(
+            port_ids=np.asarray(self.port_ids, dtype=np.int64),
+            port_labels=self.labels,
+            columns=columns,
+            codes=codes,
+            labels=labels,
+        )
+
+
+class PortTable:
+    """Tabla columnar de puertos con agregaciones group-by vectorizadas"""
+
+    def __init__(self, port_ids, port_labels, columns, codes, labels):
+        self.port_ids = port_ids
+        self.port_labels = port_labels
+        self.columns = columns
+        self.codes = codes
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.port_ids)
+
+    def metric(self, name: str) -> np.ndarray:
+        """Valores de `name` en float64, para ordenar (la suma de dos uint64 podría desbordar)"""
+        if name == "total_octets":
+            return self.columns["ifInOctets"].astype(np.float64) + self.columns["ifOutOctets"].astype(np.float64)
+        if name == "total_errors":
+            return self.columns["ifInErrors"].astype(np.float64) + self.columns["ifOutErrors"].astype(np.float64)
+        if name not in self.columns:
+            raise ValueError(f"Unknown metric '{name}'. Valid metrics: {', '.join(METRICS + DERIVED_METRICS)}")
+        return self.columns[name].astype(np.float64)
+
+    def exact(self, name: str, row: int) -> int:
+        """Valor exacto (entero de Python) de `name` en una fila"""
+        if name == "total_octets":
+            return int(self.columns["ifInOctets"][row]) + int(self.columns["ifOutOctets"][row])
+        if name == "total_errors":
+            return int(self.columns["ifInErrors"][row]) + int(self.columns["ifOutErrors"][row])
+        return int(self.columns[name][row])
+
+    def group_by(self, group: str, sort_by: str = "total_octets", top: int | None = None) -> list:
+        """Suma de cada contador por grupo (device/location/type/state), ordenada por `sort_by`"""
+        if group not in self.codes:
+            raise ValueError(f"Unknown group '{group}'. Valid groups: {', '.join(GROUPS)}")
+        codes = self.codes[group]
+        labels = self.labels[group]
+        size = len(labels)
+
+        if sort_by not in METRICS + DERIVED_METRICS:
+            raise ValueError(f"Unknown metric '{sort_by}'. Valid metrics: {', '.join(METRICS + DERIVED_METRICS)}")
+
+        counts = np.bincount(codes, minlength=size)
+        # Sumas exactas: los contadores acumulados de 64 bits pueden superar 2^63 al agregarlos
+        sums = {name: _exact_group_sums(codes, self.columns[name], size) for name in METRICS}
+        sums["total_octets"] = [a + b for a, b in zip(sums["ifInOctets"], sums["ifOutOctets"])]
+        sums["total_errors"] = [a + b for a, b in zip(sums["ifInErrors"], sums["ifOutErrors"])]
+
+        key = sums[sort_by]
+        order = sorted(range(size), key=lambda i: -key[i])
+        if top is not None:
+            order = order[:top]
+
+        return [
+            {
+                group: labels[i],
+                "ports": int(counts[i]),
+                "in_octets": sums["ifInOctets"][i],
+                "out_octets": sums["ifOutOctets"][i],
+                "total_octets": sums["total_octets"][i],
+                "total_gb": round(sums["total_octets"][i] / (1024 ** 3), 2),
+                "in_errors": sums["ifInErrors"][i],
+                "out_errors": sums["ifOutErrors"][i],
+                "speed": sums["ifSpeed"][i],
+            }
+            for i in order
+        ]
+
+    def top_ports(self, metric: str = "total_octets", k: int = 10) -> list:
+        """Los k puertos con mayor valor de `metric` (argpartition, sin ordenar toda la tabla)"""
+        values = self.metric(metric)
+        k = max(0, min(k, len(values)))
+        if k == 0:
+            return []
+        candidates = np.argpartition(-values, k - 1)[:k]
+        order = candidates[np.argsort(-values[candidates], kind="stable")]
+
+        return [
+            {
+                "port_id": int(self.port_ids[i]),
+                "port_label": self.port_labels[i],
+                "device": self.labels["device"][self.codes["device"][i]],
+                "location": self.labels["location"][self.codes["location"][i]],
+                "type": self.labels["type"][self.codes["type"][i]],
+                "state": self.labels["state"][self.codes["state"][i]],
+                metric: self.exact(metric, i),
+            }
+            for i in order
+        ]
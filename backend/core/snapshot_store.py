@@ -0,0 +1,173 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+from postgrest.types import ReturnMethod
+from core.config import SNAPSHOT_KEEP_VERSIONS, SNAPSHOT_CACHE_TTL
+from core.supabase import supabase, execute
+from core.encoded_body import EncodedBody
+
+
+class CachedSnapshot:
+    """Última versión de un snapshot ya decodificada, con su cuerpo serializado y comprimido una sola vez"""
+
+    def __init__(self, table: str, row_id, created_at: str | None, value, body: EncodedBody):
+        self.id = row_id
+        self.created_at = created_at
+        self.value = value
+        self.body = body
+        self.etag = f'"{table}-{row_id}"'
+        self.last_modified = _parse_timestamp(created_at)
+        # Datos derivados de esta versión (p. ej. la matriz del gráfico), calculados bajo demanda
+        self.derived = {}
+
+
+def _parse_timestamp(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+class SnapshotStore:
+    """Tabla de Supabase que guarda versiones de un snapshot JSON (graphs, ports_failures, ...).
+
+    Cada escritura inserta una versión nueva y después borra las que exceden
+    `keep`, así que los lectores siempre encuentran al menos una fila. La última
+    versión se lee con order(created_at desc) + limit 1, sin descargar las demás.
+
+    Toda tabla de snapshot necesita las columnas `id` y `created_at` (con valor
+    por defecto now()): la escritura, la poda, la última versión y los
+    encabezados ETag/Last-Modified dependen de ellas.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        column: str = "response",
+        keep: int = SNAPSHOT_KEEP_VERSIONS,
+        decode=None,
+        cache_ttl: float = SNAPSHOT_CACHE_TTL,
+    ):
+        self.table = table
+        self.column = column
+        self.keep = keep
+        self.decode = decode
+        self.cache_ttl = cache_ttl
+        self._cached: CachedSnapshot | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def write(self, value) -> dict:
+        """Inserta una versión nueva y poda las antiguas; devuelve {id, created_at}"""
+        query = supabase.table(self.table).insert({self.column: value}, returning=ReturnMethod.representation)
+        # select=id,created_at: PostgREST devuelve solo esas columnas y no el blob recién insertado.
+        # postgrest 1.0.x no tiene .select() tras insert() y guarda los params en el builder (después en .request)
+        request = getattr(query, "request", query)
+        request.params = request.params.set("select", "id,created_at")
+        result = await execute(query)
+        row = result.data[0]
+        self.invalidate()
+        try:
+            await self.prune()
+        except Exception as e:
+            # La versión nueva ya está escrita; las viejas se podarán en la próxima escritura
+            print(f"⚠️ No se pudieron podar versiones antiguas de {self.table}: {str(e)}")
+        return row
+
+    async def prune(self) -> int:
+        """Borra las versiones que quedan fuera de las `keep` más recientes"""
+        old = await execute(
+            supabase.table(self.table)
+            .select("id")
+            .order("created_at", desc=True)
+            .range(self.keep, self.keep + 999)
+        )
+        ids = [row["id"] for row in old.data]
+        if ids:
+            # return=minimal: no devolver los blobs borrados
+            await execute(supabase.table(self.table).delete(returning=ReturnMethod.minimal).in_("id", ids))
+        return len(ids)
+
+    async def latest(self, columns: str | None = None) -> dict | None:
+        """Fila de la versión más reciente (por defecto solo `column`), o None si no hay"""
+        result = await execute(
+            supabase.table(self.table)
+            .select(columns or self.column)
+            .order("created_at", desc=True)
+            .limit(1)
+        )
+        return result.data[0] if result.data else None
+
+    def invalidate(self):
+        self._cached = None
+        self._checked_at = 0.0
+
+    async def cached(self) -> CachedSnapshot | None:
+        """Última versión desde la caché del proceso.
+
+        Pasado `cache_ttl` solo se consulta el id de la última fila; el
+        contenido se vuelve a descargar (y decodificar) únicamente si cambió.
+        """
+        if self._cached is not None and time.time() - self._checked_at < self.cache_ttl:
+            return self._cached
+        async with self._lock:
+            if self._cached is not None and time.time() - self._checked_at < self.cache_ttl:
+                return self._cached
+
+            head = await self.latest("id, created_at")
+            if head is None:
+                self.invalidate()
+                return None
+            if self._cached is None or self._cached.id != head["id"]:
+                row = await self.latest(f"id, created_at, {self.column}")
+                if row is None:
+                    self.invalidate()
+                    return None
+                value = row[self.column]
+                if self.decode is not None:
+                    value = await asyncio.to_thread(self.decode, value)
+                body = await asyncio.to_thread(EncodedBody.from_value, value)
+                self._cached = CachedSnapshot(self.table, row["id"], row.get("created_at"), value, body)
+            self._checked_at = time.time()
+            return self._cached
+
+    def stats(self) -> dict:
+        return {
+            "table": self.table,
+            "cached_id": self._cached.id if self._cached else None,
+            "cached_bytes": self._cached.body.sizes() if self._cached else None,
+            "checked_at": self._checked_at or None,
+            "ttl_seconds": self.cache_ttl,
+        }
+
+
+def _not_modified(request: Request, snapshot: CachedSnapshot) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or snapshot.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and snapshot.last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return snapshot.last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def snapshot_response(request: Request, snapshot: CachedSnapshot) -> Response:
+    """Respuesta JSON precomprimida con ETag/Last-Modified; 304 si el cliente ya tiene esta versión"""
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if snapshot.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(snapshot.last_modified, usegmt=True)
+    if _not_modified(request, snapshot):
+        return Response(status_code=304, headers=headers)
+    return snapshot.body.response(request, headers=headers)
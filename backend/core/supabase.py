@@ -1,7 +1,37 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from supabase import create_client, Client
-from core.config import SUPABASE_URL, SUPABASE_API_KEY
+from core.config import SUPABASE_URL, SUPABASE_API_KEY, SUPABASE_MAX_WORKERS
 
 if SUPABASE_URL is None or SUPABASE_API_KEY is None:
     raise ValueError("Supabase URL and API key must be set")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_API_KEY)
\ No newline at end of file
+# Un único cliente por proceso, compartido por todas las rutas de datos
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_API_KEY)
+
+
+def create_auth_client() -> Client:
+    """Cliente nuevo para un login: sign_in_with_password guarda la sesión del usuario
+    en el cliente, así que no se comparte ni con las demás rutas ni entre logins"""
+    return create_client(SUPABASE_URL, SUPABASE_API_KEY)
+
+
+# El cliente de supabase-py es síncrono: cada .execute() es un round trip HTTP
+# bloqueante. Lo ejecutamos en un pool acotado para no bloquear el event loop.
+_executor = ThreadPoolExecutor(max_workers=SUPABASE_MAX_WORKERS, thread_name_prefix="supabase")
+
+
+async def run_db(func, *args, **kwargs):
+    """Ejecuta una llamada bloqueante de Supabase en el pool de hilos"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+async def execute(query):
+    """Equivalente no bloqueante de query.execute()"""
+    return await run_db(query.execute)
+
+
+def shutdown_db_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,66 @@
+import numpy as np
+
+
+def graph_matrix(graph_data: dict):
+    """Convierte `data` de un gráfico de Observium en una matriz columnar.
+
+    Devuelve (matriz, timestamps): la matriz es (n_pasos, n_leyenda) float64 con
+    NaN donde el valor es None o la fila viene incompleta; timestamps son los
+    segundos epoch de cada fila (ver graph_timestamps).
+    """
+    meta = graph_data['meta']
+    rows = graph_data['data']
+    width = len(meta['legend'])
+
+    # Camino rápido: filas rectangulares se convierten de una vez (None -> NaN)
+    try:
+        matrix = np.array(rows, dtype=float)
+    except (TypeError, ValueError):
+        matrix = None
+    if matrix is not None and matrix.ndim == 2 and matrix.shape[1] >= width:
+        return np.ascontiguousarray(matrix[:, :width]), graph_timestamps(meta, len(rows))
+
+    # Filas irregulares (incompletas o vacías): se copian una a una
+    matrix = np.full((len(rows), width), np.nan)
+    for day_idx, day_values in enumerate(rows):
+        if isinstance(day_values, list) and day_values:
+            values = day_values[:width]
+            matrix[day_idx, :len(values)] = np.asarray(values, dtype=float)
+
+    return matrix, graph_timestamps(meta, len(rows))
+
+
+def graph_timestamps(meta: dict, n_rows: int) -> np.ndarray:
+    """Segundos epoch de cada fila: meta.start + i * meta.step.
+
+    En un gráfico con predicción las filas desde `history_points` son la
+    predicción, espaciadas `forecast_step` (p. ej. 30 días con prophet) a partir
+    de start_prediction, de modo que la última cae en end_prediction.
+    """
+    timestamps = meta['start'] + np.arange(n_rows, dtype=np.int64) * meta['step']
+    history = meta.get('history_points')
+    forecast_step = meta.get('forecast_step')
+    if history is not None and forecast_step and history < n_rows:
+        ahead = np.arange(1, n_rows - history + 1, dtype=np.int64)
+        timestamps[history:] = meta['start_prediction'] + ahead * forecast_step
+    return timestamps
+
+
+def split_series(matrix: np.ndarray, min_points: int = 10):
+    """Separa las columnas en series (idx, posiciones, valores, es_negativa).
+
+    La leyenda trae primero las series positivas y después sus negativas
+    (misma IP, tráfico de salida); las negativas se devuelven con el signo
+    invertido. Las series con menos de `min_points` valores se descartan.
+    """
+    num_ips = matrix.shape[1] // 2
+    series = []
+    for i in range(num_ips):
+        for idx, is_negative in [(i, False), (i + num_ips, True)]:
+            column = matrix[:, idx]
+            positions = np.flatnonzero(~np.isnan(column))
+            if len(positions) < min_points:
+                continue
+            values = column[positions]
+            series.append((idx, positions, -values if is_negative else values, is_negative))
+    return series
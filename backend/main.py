@@ -3,84 +3,84 @@ from fastapi.middleware.cors import CORSMiddleware
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from contextlib import asynccontextmanager
-from routes import auth, alerts, ports, devices, graphs,address
-import asyncio
+from routes import auth, alerts, ports, devices, graphs,address, system
+from core.observium import start_observium_client, close_observium_client
+from core.supabase import shutdown_db_executor
+from core.forecasting import shutdown_forecast_executor
+from core.config import PORT_SNAPSHOT_TTL, SCHEDULER_JITTER
+from core.job_runs import job_telemetry
 
 scheduler = AsyncIOScheduler()
-loop = None
+job_telemetry.scheduler = scheduler
 
 # Función para llamar la ruta desde dentro del servidor
 async def scheduled_save_alerts():
     from routes.alerts import save_alerts_to_db
-    await save_alerts_to_db()
+    return await save_alerts_to_db()
 
-async def scheduled_save_graphs():
-    from routes.graphs import save_graph_data
-    await save_graph_data()
-
-async def scheduled_save_predictions():
-    from routes.graphs import save_prediction_data
-    await save_prediction_data()
+async def scheduled_graph_pipeline():
+    # Una sola descarga del gráfico para el snapshot crudo y para la predicción
+    from routes.graphs import run_graph_pipeline
+    return await run_graph_pipeline()
 
 async def scheduled_save_ports_failures():
     from routes.ports import save_failures_data
-    await save_failures_data()
+    return await save_failures_data()
 
 async def scheduled_save_consumption_internet():
     from routes.ports import save_internet_consumption_data
-    await save_internet_consumption_data()
+    return await save_internet_consumption_data()
+
+async def scheduled_refresh_port_snapshot():
+    from core.port_snapshot import port_snapshot
+    await port_snapshot.refresh()
 
 async def scheduled_save_consumption_non_internet():
     from routes.ports import save_non_internet_consumption_data
-    await save_non_internet_consumption_data()
+    return await save_non_internet_consumption_data()
+
+def add_scheduled_job(job_id: str, func, jitter: int = SCHEDULER_JITTER, **interval):
+    """Registra un job con telemetría cada `interval` (hours=, minutes=, seconds=),
+    sin solapamientos (max_instances=1) y agrupando las ejecuciones atrasadas en
+    una sola (coalesce). El jitter va en el trigger: add_job lo ignora si se le
+    pasa una instancia de trigger."""
+    scheduler.add_job(
+        job_telemetry.run,
+        trigger=IntervalTrigger(**interval, jitter=jitter),
+        args=[job_id, func],
+        id=job_id,
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global loop
-    loop = asyncio.get_running_loop()  # guardamos el event loop principal
+    await start_observium_client()  # cliente HTTP compartido hacia Observium
 
     # asyncio.create_task(scheduled_save_consumption_internet())
     # asyncio.create_task(scheduled_save_consumption_non_internet())
 
-    # Ejecutar cada 5 minutos
-    scheduler.add_job(
-        lambda: asyncio.run_coroutine_threadsafe(scheduled_save_alerts(), loop if loop is not None else asyncio.get_event_loop()),
-        trigger=IntervalTrigger(minutes=180)
-    )
-
-    scheduler.add_job(
-        lambda: asyncio.run_coroutine_threadsafe(scheduled_save_graphs(), loop),
-        trigger=IntervalTrigger(hours=24),
-        id="save_graphs"
-    )
-    
-    scheduler.add_job(
-        lambda: asyncio.run_coroutine_threadsafe(scheduled_save_predictions(), loop),
-        trigger=IntervalTrigger(hours=24),
-        id="save_predictions"
-    )
-
-    scheduler.add_job(
-        lambda: asyncio.run_coroutine_threadsafe(scheduled_save_ports_failures(), loop),
-        trigger=IntervalTrigger(hours=24),
-        id="save_ports_failures"
-    )
-
-    scheduler.add_job(
-        lambda: asyncio.run_coroutine_threadsafe(scheduled_save_consumption_internet(), loop),
-        trigger=IntervalTrigger(hours=24),
-        id="save_consumption_internet"
-    )
-
-    scheduler.add_job(
-        lambda: asyncio.run_coroutine_threadsafe(scheduled_save_consumption_non_internet(), loop),
-        trigger=IntervalTrigger(hours=24),
-        id="save_consumption_non_internet"
+    # Los jobs son corrutinas: el AsyncIOScheduler las ejecuta en el event loop
+    # de la app, así que max_instances cubre toda la duración de cada ejecución
+    add_scheduled_job("save_alerts", scheduled_save_alerts, minutes=180)
+    add_scheduled_job("graph_pipeline", scheduled_graph_pipeline, hours=24)
+    add_scheduled_job("save_ports_failures", scheduled_save_ports_failures, hours=24)
+    add_scheduled_job("save_consumption_internet", scheduled_save_consumption_internet, hours=24)
+    add_scheduled_job("save_consumption_non_internet", scheduled_save_consumption_non_internet, hours=24)
+    add_scheduled_job(
+        "refresh_port_snapshot",
+        scheduled_refresh_port_snapshot,
+        seconds=PORT_SNAPSHOT_TTL,
+        jitter=min(SCHEDULER_JITTER, int(PORT_SNAPSHOT_TTL // 10)),
     )
 
     scheduler.start()
     yield
     scheduler.shutdown()
+    await close_observium_client()
+    shutdown_db_executor()
+    shutdown_forecast_executor()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -97,4 +97,5 @@ app.include_router(alerts.router)
 app.include_router(devices.router)
 app.include_router(ports.router)
 app.include_router(graphs.router)
-app.include_router(address.router)
\ No newline at end of file
+app.include_router(address.router)
+app.include_router(system.router)
\ No newline at end of file
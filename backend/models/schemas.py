@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 
 
 class LoginRequest(BaseModel):
@@ -36,4 +36,7 @@ class AlertDB(BaseModel):
     status: Optional[str]
     recovered: Optional[str]
     completado: Optional[str]
-    device: Optional[DeviceInfo] 
\ No newline at end of file
+    device: Optional[DeviceInfo] 
+class CoreLookupRequest(BaseModel):
+    ips: List[str]
+    with_names: bool = False
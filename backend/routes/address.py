@@ -1,188 +1,148 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List
-import httpx
+from core.observium import get_observium_client
+from core.device_cache import device_cache
+from core.config import ADDRESS_RESOLVE_CONCURRENCY, DEVICE_NAMES_TTL, DEVICE_NAMES_STATE_PATH
+from core.ip_index import get_core_index, reload_core_index
+from models.schemas import CoreLookupRequest
 import os
+import json
+import time
+import asyncio
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from core.snapshot_store import SnapshotStore, snapshot_response
 from pydantic import BaseModel
 
 load_dotenv() 
 OBSERVIUM_API_BASE = os.getenv("API_URL")
-OBS_USER = os.getenv("API_USERNAME")
-OBS_PASS = os.getenv("API_PASSWORD")
 
 router = APIRouter()
+device_names_store = SnapshotStore("device_names", column="ip_to_name_map")
 
-URL = os.getenv("SUPABASE_URL")
-KEY = os.getenv("SUPABASE_API_KEY")
-if not URL or not KEY:
-    raise RuntimeError("SUPABASE_URL and SUPABASE_KEY environment variables must be set")
-supabase: Client = create_client(URL, KEY)
+async def resolve_ip(ip: str) -> dict:
+    """Resuelve una IP a su dispositivo: /address/?ipv4_address= y luego /devices/{id}.
 
-async def fetch_and_save_device_names():
-    """Función para obtener y guardar los nombres de dispositivos"""
+    Devuelve {"ip", "device_id", "sys_name", "error", "elapsed_ms"}; `error` es
+    None si todo fue bien y "No device for address" si Observium no conoce la IP.
+    """
+    started = time.perf_counter()
+    result = {"ip": ip, "device_id": None, "sys_name": None, "error": None}
     try:
-        # Obtener todas las IPs del ipMap (deberías mover esto a configuración)
-        ip_map = {
-            "172.30.246.": "172.30.246.254",
-            "172.30.246.": "172.30.246.254",
-            "172.19.255": "172.19.255.23",
-            "172.31.14": "172.31.141.1",
-            "10.61.5": "10.61.50.1",
-            "172.31.11": "172.31.113.1",
-            "172.19.25": "172.19.255.6",
-            "172.19.3": "172.19.30.1",
-            "172.19.6": "172.19.65.1",
-            "172.21.25": "172.21.255.6",
-            "172.31.243": "172.31.243.10",
-            "172.31.11": "172.31.110.1",
-            "172.31.5": "172.31.53.1",
-            "172.28.": "172.28.0.1",
-            "10.61.5": "10.61.50.1",
-            "172.19.25": "172.19.255.6",
-            "172.19.3": "172.19.30.1",
-            "172.19.6": "172.19.65.1",
-            "172.19.25": "172.19.255.6",
-            "172.19.3": "172.19.30.1",
-            "172.22.1": "172.22.16.1",
-            "172.24.1": "172.24.13.1",
-            "172.24.1": "172.24.13.1",
-            "172.31.1.": "172.31.1.100",
-            "172.31.1.": "172.31.1.100",
-            "10.2.0.": "10.2.0.254",
-            "10.1.": "10.1.5.1",
-            "172.31.5": "172.31.53.1",
-            "172.31.5": "172.31.53.1",
-            "172.21.25": "172.21.255.6",
-            "172.31.1": "172.31.10.1",
-            "172.31.12": "172.31.127.1",
-            "10.20.1": "10.20.11.1",
-            "172.31.1": "172.31.17.1",
-            "172.31.11": "172.31.113.1",
-            "172.31.17": "172.31.175.1",
-            "172.31.16": "172.31.160.1",
-            "172.31.11": "172.31.110.1",
-            "172.31.21": "172.31.218.1",
-            "10.2.0": "10.2.0.14",
-            "10.2.0": "10.2.0.14",
-            "172.31.7": "172.31.79.1",
-            "172.31.7": "172.31.72.1",
-            "172.24.1": "172.24.11.1",
-            "172.24.": "172.24.0.1",
-            "172.24.1": "172.24.15.1",
-            "172.31.12": "172.31.120.1",
-            "172.31.11": "172.31.113.1",
-            "172.31.7": "172.31.72.1",
-            "172.21.25": "172.21.255.6",
-            "172.21.25": "172.21.255.6",
-            "172.31.12": "172.31.120.1",
-            "172.31.14": "172.31.141.1",
-            "172.31.6": "172.31.69.1",
-            "172.31.5": "172.31.53.1",
-            "10.61.5": "10.61.50.1",
-            "172.19.3": "172.19.30.1",
-            "172.21.25": "172.21.255.6",
-            "172.21.25": "172.21.255.6",
-            "172.31.11": "172.31.113.1",
-            "172.31.33": "172.31.33.52",
-            "172.31.3": "172.31.35.1",
-            "172.30.31.": "172.30.31.254",
-            "172.255.255": "172.255.255.99",
-            "10.20.1": "10.20.11.1",
-            "172.31.243": "172.31.243.10",
-            "172.31.8": "172.31.86.1",
-            "172.21.25": "172.21.255.6",
-            "172.21.25": "172.21.255.4",
-            "172.21.28": "172.21.28.10",
-            "10.20.": "10.20.0.1",
-            "172.31.": "172.31.2.1",
-            "172.31.": "172.31.1.4",
-            "172.31.14": "172.31.141.1",
-            "172.31.5": "172.31.53.1",
-            "172.31.5": "172.31.53.1",
-            "172.31.": "172.31.1.4",
-            "172.31.": "172.31.2.1",
-            "172.31.": "172.31.8.1",
-            "172.21.25": "172.21.255.6",
-            "172.24.1": "172.24.13.1",
-            "172.24.": "172.24.0.1",
-            "172.31.1": "172.31.10.1",
-            "172.31.5": "172.31.53.1",
-            "172.31.1": "172.31.10.1",
-            "172.31.241": "172.31.241.10",
-            "172.31.17": "172.31.175.1",
-            "172.30.246.": "172.30.246.254",
-            "172.31.11": "172.31.117.1",
-            "172.31.241": "172.31.241.10",
-            "172.30.220.": "172.30.220.254",
-            "172.31.22": "172.31.220.1",
-            "172.30.27.": "172.30.27.254",
-            "172.31.241": "172.31.241.10",
-            "172.31.8": "172.31.80.1",
-            "172.31.241": "172.31.241.10",
-            "172.31.4": "172.31.45.1",
-            "172.31.241": "172.31.241.10",
-            "172.31.1.": "172.31.1.100",
-            "172.30.89.": "172.30.89.246",
-            "172.30.89.": "172.30.89.246",
-            "172.31.5": "172.31.53.1",
-            "172.31.1": "172.31.1.68",
-            "172.30.89.": "172.30.89.246",
-        }
-        ip_list = list(ip_map.values())
+        client = get_observium_client()
+        response = await client.get(
+            f"{OBSERVIUM_API_BASE}/address/?ipv4_address={ip}"
+        )
+
+        if response.status_code != 200:
+            result["error"] = "Address lookup failed"
+        else:
+            addresses = response.json().get("addresses", [])
+            if not addresses or "device_id" not in addresses[0]:
+                result["error"] = "No device for address"
+            else:
+                result["device_id"] = addresses[0]["device_id"]
+                device = await device_cache.get(result["device_id"])
+
+                if device is None:
+                    result["error"] = "Device fetch failed"
+                else:
+                    result["sys_name"] = device.get("sysName")
+
+    except Exception as e:
+        result["error"] = str(e)
+
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+async def resolve_ips(ips: List[str], concurrency: int = ADDRESS_RESOLVE_CONCURRENCY) -> dict:
+    """Resuelve varias IPs en paralelo (acotado por un semáforo), sin repetir IPs duplicadas"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    unique_ips = list(dict.fromkeys(ips))
+
+    async def bounded(ip):
+        async with semaphore:
+            return await resolve_ip(ip)
+
+    results = await asyncio.gather(*(bounded(ip) for ip in unique_ips))
+    return {item["ip"]: item for item in results}
+
+
+def _load_names_state() -> dict:
+    """{ip: {"resolved_at": epoch, "ok": bool}} de las últimas resoluciones"""
+    try:
+        with open(DEVICE_NAMES_STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_names_state(state: dict):
+    tmp_path = f"{DEVICE_NAMES_STATE_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, DEVICE_NAMES_STATE_PATH)
+
+async def fetch_and_save_device_names(incremental: bool = True):
+    """Función para obtener y guardar los nombres de dispositivos.
+
+    En modo incremental solo se vuelven a resolver las IPs nuevas, las que
+    caducaron (DEVICE_NAMES_TTL) o las que fallaron la última vez (core_{ip});
+    el resto se toma del mapeo guardado. Solo se escribe si el mapeo cambia.
+    """
+    try:
+        # IPs de los cores, desde la tabla de prefijos (data/core_prefixes.json)
+        ip_list = get_core_index().cores()
+
+        # Mapeo guardado actualmente
+        existing = await device_names_store.latest("id, ip_to_name_map")
+        stored = (existing["ip_to_name_map"] or {}) if existing else {}
+        state = _load_names_state()
+        now = time.time()
+
+        if incremental:
+            stale = [
+                ip for ip in ip_list
+                if ip not in stored
+                or stored[ip] == f"core_{ip}"
+                or not state.get(ip, {}).get("ok")
+                or now - state.get(ip, {}).get("resolved_at", 0) > DEVICE_NAMES_TTL
+            ]
+        else:
+            stale = ip_list
 
         # Fetch device names from Observium
-        device_names = []
-        async with httpx.AsyncClient() as client:
-            for ip in ip_list:
-                try:
-                    response = await client.get(
-                        f"{OBSERVIUM_API_BASE}/address/?ipv4_address={ip}",
-                        auth=(OBS_USER, OBS_PASS)
-                    )
-                    
-                    if response.status_code != 200:
-                        device_names.append(f"core_{ip}")
-                        continue
-
-                    addresses = response.json().get("addresses", [])
-                    if not addresses or "device_id" not in addresses[0]:
-                        device_names.append(f"core_{ip}")
-                        continue
-
-                    device_id = addresses[0]["device_id"]
-                    response = await client.get(
-                        f"{OBSERVIUM_API_BASE}/devices/{device_id}",
-                        auth=(OBS_USER, OBS_PASS)
-                    )
-
-                    if response.status_code != 200:
-                        device_names.append(f"core_{ip}")
-                        continue
-
-                    device = response.json().get("device", {})
-                    sys_name = device.get("sysName", f"core_{ip}")
-                    device_names.append(sys_name)
-
-                except Exception:
-                    device_names.append(f"core_{ip}")
-
-        # Crear el mapeo IP -> Nombre
-        ip_to_name = {ip: name for ip, name in zip(ip_list, device_names)}
-
-        # Guardar en Supabase (solo mantenemos un registro)
-        existing = supabase.table("device_names").select("*").execute()
-        if existing.data:
-            supabase.table("device_names").delete().neq("id", "").execute()
-        
-        result = supabase.table("device_names").insert({
-            "ip_to_name_map": ip_to_name
-        }).execute()
+        resolved = await resolve_ips(stale)
+        ip_to_name = {}
+        for ip in ip_list:
+            if ip in resolved:
+                item = resolved[ip]
+                ok = item["error"] is None and bool(item["sys_name"])
+                ip_to_name[ip] = item["sys_name"] if ok else f"core_{ip}"
+                state[ip] = {"resolved_at": now, "ok": ok}
+            else:
+                ip_to_name[ip] = stored[ip]
+
+        # IPs que ya no están en la tabla de cores
+        state = {ip: info for ip, info in state.items() if ip in ip_to_name}
+
+        # El estado solo se guarda cuando el mapeo en la BD ya refleja lo resuelto
+        if existing and ip_to_name == stored:
+            _save_names_state(state)
+            return {
+                "message": "Device names unchanged",
+                "count": len(ip_to_name),
+                "resolved": len(stale),
+                "id": existing["id"]
+            }
+
+        # Guardar en Supabase como una nueva versión (las antiguas se podan después)
+        row = await device_names_store.write(ip_to_name)
+        _save_names_state(state)
 
         return {
             "message": "Device names stored successfully",
             "count": len(ip_to_name),
-            "id": result.data[0]["id"]
+            "resolved": len(stale),
+            "id": row["id"]
         }
 
     except Exception as e:
@@ -192,12 +152,12 @@ async def fetch_and_save_device_names():
 @router.get(
     "/update_device_names",
     summary="Update device names in database",
-    description="Fetches device names from Observium and stores them in Supabase",
+    description="Fetches device names from Observium and stores them in Supabase. By default only new, stale or previously failed IPs are re-resolved; full=true re-resolves every core.",
     tags=["Device Names"]
 )
-async def update_device_names():
+async def update_device_names(full: bool = Query(False, description="Re-resolve every core IP instead of only stale or failed ones")):
     try:
-        return await fetch_and_save_device_names()
+        return await fetch_and_save_device_names(incremental=not full)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -208,14 +168,14 @@ async def update_device_names():
     tags=["Device Names"],
     response_model=dict
 )
-async def get_device_names_from_db():
+async def get_device_names_from_db(request: Request):
     try:
-        response = supabase.table("device_names").select("*").order("created_at", desc=True).limit(1).execute()
+        snapshot = await device_names_store.cached()
         
-        if not response.data:
+        if snapshot is None:
             raise HTTPException(status_code=404, detail="No device names found in database")
         
-        return response.data[0]["ip_to_name_map"]
+        return snapshot_response(request, snapshot)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     
@@ -225,47 +185,75 @@ async def get_device_names_from_db():
     description="Takes a list of IPs and returns the corresponding device names from Observium.",
     tags=["Address"]
 )
-async def get_device_names(ips: List[str] = Query(..., description="List of IP addresses")):
+async def get_device_names(
+    ips: List[str] = Query(..., description="List of IP addresses"),
+    concurrency: int = Query(ADDRESS_RESOLVE_CONCURRENCY, ge=1, le=100, description="Maximum simultaneous lookups against Observium"),
+):
     try:
-        device_names = []
-
-        async with httpx.AsyncClient() as client:
-            for ip in ips:
-                try:
-                    response = await client.get(
-                        f"{OBSERVIUM_API_BASE}/address/?ipv4_address={ip}",
-                        auth=(OBS_USER, OBS_PASS)
-                    )
+        started = time.perf_counter()
+        resolved = await resolve_ips(ips, concurrency)
 
-                    if response.status_code != 200:
-                        device_names.append({"ip": ip, "error": "Address lookup failed"})
-                        continue
-
-                    addresses = response.json().get("addresses", [])
-                    if not addresses or "device_id" not in addresses[0]:
-                        device_names.append(f"core_{ip}")  # ← Nueva versión
-                        continue
-
-                    device_id = addresses[0]["device_id"]
+        # Misma forma de respuesta que antes, en el orden de entrada
+        device_names = []
+        for ip in ips:
+            item = resolved[ip]
+            if item["error"] == "No device for address":
+                device_names.append(f"core_{ip}")
+            elif item["error"] is not None:
+                device_names.append({"ip": ip, "error": item["error"]})
+            else:
+                device_names.append(item["sys_name"] or "Unknown")
 
-                    response = await client.get(
-                        f"{OBSERVIUM_API_BASE}/devices/{device_id}",
-                        auth=(OBS_USER, OBS_PASS)
-                    )
+        return {
+            "results": device_names,
+            "details": [resolved[ip] for ip in ips],
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
 
-                    if response.status_code != 200:
-                        device_names.append({"ip": ip, "error": "Device fetch failed"})
-                        continue
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-                    device = response.json().get("device", {})
-                    sys_name = device.get("sysName", "Unknown")
+@router.post(
+    "/address/cores",
+    summary="Resolve IPs to their core router",
+    description="Longest-prefix match of each IP against the core prefix table. Resolves thousands of IPs in one call without querying Observium; with_names adds the stored device name of each core.",
+    tags=["Address"]
+)
+async def lookup_cores(request: CoreLookupRequest):
+    try:
+        index = get_core_index()
+        matches = index.lookup_many(request.ips)
 
-                    device_names.append(sys_name)
+        names = {}
+        if request.with_names:
+            snapshot = await device_names_store.cached()
+            names = (snapshot.value if snapshot else None) or {}
 
-                except Exception as inner_e:
-                    device_names.append({"ip": ip, "error": str(inner_e)})
+        results = []
+        for ip in request.ips:
+            core = matches[ip]
+            item = {"ip": ip, "core": core}
+            if request.with_names:
+                item["core_name"] = names.get(core) if core else None
+            results.append(item)
 
-        return {"results": device_names}
+        return {
+            "results": results,
+            "matched": sum(1 for item in results if item["core"] is not None),
+            "unmatched": sum(1 for item in results if item["core"] is None)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
+@router.post(
+    "/address/cores/reload",
+    summary="Reload the core prefix table",
+    description="Re-reads the core prefix table from disk (CORE_PREFIXES_PATH) without restarting the server. A table that assigns the same prefix to two cores is rejected and the current index is kept.",
+    tags=["Address"]
+)
+async def reload_cores():
+    try:
+        index = reload_core_index()
+        return {"status": "success", "prefixes": index.index.size, "cores": len(index.cores())}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
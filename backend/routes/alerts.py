@@ -1,28 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends, Path
+from fastapi import APIRouter, HTTPException, Depends, Path, Query
 from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-import httpx
+from core.config import ALERTS_SYNC_CHUNK_SIZE, ALERTS_STATE_PATH
+from core.observium import get_observium_client
+from core.device_cache import get_device_info, device_inventory
 import os
 from dotenv import load_dotenv
 from models.schemas import Alert, DeviceInfo, AlertDB
-from typing import List
-from supabase import create_client, Client
+from typing import List, Annotated
+from core.supabase import supabase, execute
 import asyncio
+import hashlib
+import json
 
 
 load_dotenv()
 
-OBS_USER = os.getenv("API_USERNAME") or ""
-OBS_PASS = os.getenv("API_PASSWORD") or ""
 router = APIRouter()
 security = HTTPBasic()
 
 OBSERVIUM_API_BASE = os.getenv("API_URL")
-URL = os.getenv("SUPABASE_URL")
-KEY = os.getenv("SUPABASE_API_KEY")
-if not URL or not KEY:
-    raise RuntimeError("SUPABASE_URL and SUPABASE_KEY environment variables must be set")
-supabase: Client = create_client(URL, KEY)
 
 @router.get(
     "/alerts",
@@ -31,66 +28,70 @@ supabase: Client = create_client(URL, KEY)
     response_model=List[Alert],
     tags=["Alerts"]
 )
-async def Alerts_get_all():
+async def Alerts_get_all(
+    enrichment: Annotated[str, Query(description="Device enrichment mode: inventory (one /devices fetch, joined in memory) or per_device")] = "inventory",
+):
+    if enrichment not in ("inventory", "per_device"):
+        raise HTTPException(status_code=400, detail="Invalid enrichment. Valid values: inventory, per_device")
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_BASE}/alerts/?pagination=1&pagesize=1000",
-                auth=(OBS_USER,OBS_PASS)
-            )
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch alerts")
-            
-            alerts_data = response.json()
-            raw_alerts = alerts_data.get("alerts", {})
-            
-            device_ids = {alert.get("device_id") for alert in raw_alerts.values() if alert.get("device_id")}
-            async def fetch_device(device_id):
-                device_resp = await client.get(
-                    f"{OBSERVIUM_API_BASE}/devices/{device_id}",
-                    auth=(OBS_USER, OBS_PASS)
-                )
-                if device_resp.status_code == 200:
-                    try:
-                        device_json = device_resp.json()
-                        if isinstance(device_json, dict):
-                            return device_id, device_json.get("device", device_json)
-                        else:
-                            return device_id, {}
-                    except Exception:
-                        return device_id, {}
+        client = get_observium_client()
+        response = await client.get(
+            f"{OBSERVIUM_API_BASE}/alerts/?pagination=1&pagesize=1000"
+        )
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Failed to fetch alerts")
+        
+        alerts_data = response.json()
+        raw_alerts = alerts_data.get("alerts", {})
+        
+        device_ids = {alert.get("device_id") for alert in raw_alerts.values() if alert.get("device_id")}
+        devices_map = {}
+        if enrichment == "inventory":
+            # Un solo GET /devices (o el snapshot reciente) y join en memoria
+            try:
+                inventory = await device_inventory.get_index()
+                devices_map = {str(did): inventory[str(did)] for did in device_ids if str(did) in inventory}
+            except Exception as e:
+                print(f"⚠️ No se pudo obtener el inventario de dispositivos, se consulta uno por uno: {str(e)}")
+
+        async def fetch_device(device_id):
+            try:
+                return device_id, await get_device_info(device_id)
+            except Exception:
                 return device_id, {}
-            device_results = await asyncio.gather(*(fetch_device(did) for did in device_ids))
-            
-            devices_map = {str(did): info for did, info in device_results}
-            parsed_alerts = []
-            for alert in raw_alerts.values():
-                device_id = str(alert.get("device_id"))
-                device_info = devices_map.get(device_id, {})
-                parsed_alert = Alert(
-                    alert_table_id=alert.get("alert_table_id"),
-                    device_id=device_id,
-                    last_ok=alert.get("last_ok"),
-                    severity=alert.get("severity"),
-                    status=alert.get("status"),
-                    recovered=alert.get("recovered"),
-                    device=DeviceInfo(
-                        hostname=device_info.get("hostname"),
-                        ip=device_info.get("ip"),
-                        location=device_info.get("location"),
-                        location_id=device_info.get("location_id"),
-                        location_lat=device_info.get("location_lat"),
-                        location_lon=device_info.get("location_lon"),
-                        sysName=device_info.get("sysName"),
-                        os=device_info.get("os"),
-                        vendor=device_info.get("vendor"),
-                        type=device_info.get("type"),
-                        status=device_info.get("status"),
-                    ) if device_info else None
-                )
-                parsed_alerts.append(parsed_alert)
-           
-            return parsed_alerts
+        # Dispositivos que no están en el inventario (o modo per_device): consulta individual con caché
+        missing = [did for did in device_ids if str(did) not in devices_map]
+        device_results = await asyncio.gather(*(fetch_device(did) for did in missing))
+        devices_map.update({str(did): info for did, info in device_results})
+
+        parsed_alerts = []
+        for alert in raw_alerts.values():
+            device_id = str(alert.get("device_id"))
+            device_info = devices_map.get(device_id, {})
+            parsed_alert = Alert(
+                alert_table_id=alert.get("alert_table_id"),
+                device_id=device_id,
+                last_ok=alert.get("last_ok"),
+                severity=alert.get("severity"),
+                status=alert.get("status"),
+                recovered=alert.get("recovered"),
+                device=DeviceInfo(
+                    hostname=device_info.get("hostname"),
+                    ip=device_info.get("ip"),
+                    location=device_info.get("location"),
+                    location_id=device_info.get("location_id"),
+                    location_lat=device_info.get("location_lat"),
+                    location_lon=device_info.get("location_lon"),
+                    sysName=device_info.get("sysName"),
+                    os=device_info.get("os"),
+                    vendor=device_info.get("vendor"),
+                    type=device_info.get("type"),
+                    status=device_info.get("status"),
+                ) if device_info else None
+            )
+            parsed_alerts.append(parsed_alert)
+
+        return parsed_alerts
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -104,65 +105,117 @@ async def Alerts_get_all():
 async def Alerts_get_id(alert_id: int = Path(..., description="The ID of the alert to retrieve"),
 ):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_BASE}/alerts/{alert_id}",
-                auth=(OBS_USER,OBS_PASS)
-            )
+        client = get_observium_client()
+        response = await client.get(
+            f"{OBSERVIUM_API_BASE}/alerts/{alert_id}"
+        )
 
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch alert")
-            
-            return response.json()
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Failed to fetch alert")
+        
+        return response.json()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+def _alert_row(alert: Alert) -> dict:
+    return {
+        "alert_table_id": alert.alert_table_id,
+        "device_id": alert.device_id,
+        "last_ok": alert.last_ok,
+        "severity": alert.severity,
+        "status": alert.status,
+        "recovered": alert.recovered,
+        "device": alert.device.dict() if alert.device else {}
+    }
+
+def _alert_fingerprint(row: dict) -> str:
+    payload = json.dumps(row, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def _load_sync_state() -> dict:
+    """Huellas {alert_table_id: hash} guardadas en la última sincronización"""
+    try:
+        with open(ALERTS_STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_sync_state(state: dict):
+    tmp_path = f"{ALERTS_STATE_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, ALERTS_STATE_PATH)
+
+def _chunks(rows: list, size: int):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
 # Esta es la función que el scheduler llama
-async def save_alerts_to_db():
+async def save_alerts_to_db(chunk_size: int = ALERTS_SYNC_CHUNK_SIZE):
+    """Sincroniza las alertas de Observium con la tabla 'alerts' usando escrituras por lotes.
+
+    Solo se escriben las alertas cuyo contenido cambió desde la última
+    sincronización (según la huella guardada en ALERTS_STATE_PATH). Las alertas
+    con completado == 'SI' no se tocan. Devuelve los conteos de filas
+    insertadas, actualizadas, sin cambios y omitidas.
+    """
     print("⏳ Ejecutando fetch y guardado de alerts en BD...")
 
     try:
         # Obtener las alertas desde Observium API
-        from routes.alerts import Alerts_get_all
         api_alerts = await Alerts_get_all()
         
-        # Obtener las alertas existentes de la BD
-        db_response = supabase.table("alerts").select("*").execute()
+        # Obtener el estado 'completado' de las alertas existentes en la BD
+        db_response = await execute(supabase.table("alerts").select("alert_table_id, completado"))
         db_alerts = {str(alert['alert_table_id']): alert for alert in db_response.data}
+        state = _load_sync_state()
+        new_state = {}
 
-        # Procesar cada alerta de la API
+        # Calcular los cambios en memoria
+        to_insert = []
+        to_update = []
+        unchanged = 0
+        skipped = 0
         for alert in api_alerts:
             alert_id = str(alert.alert_table_id)
-            
+            row = _alert_row(alert)
+            fingerprint = _alert_fingerprint(row)
+
             # Si la alerta ya existe en la BD
             if alert_id in db_alerts:
-                # Si está marcada como completada, la saltamos
+                # Si está marcada como completada, la saltamos; se conserva la huella
+                # anterior para que, si se reabre, la fila se vuelva a escribir
                 if db_alerts[alert_id].get('completado') == 'SI':
+                    skipped += 1
+                    if alert_id in state:
+                        new_state[alert_id] = state[alert_id]
                     continue
-                    
-                # Si no está completada, actualizamos sus datos pero mantenemos el estado 'completado'
-                supabase.table("alerts").update({
-                    "device_id": alert.device_id,
-                    "last_ok": alert.last_ok,
-                    "severity": alert.severity,
-                    "status": alert.status,
-                    "recovered": alert.recovered,
-                    "device": alert.device.dict() if alert.device else {}
-                }).eq("alert_table_id", alert_id).execute()
+
+                # Mismo contenido que en la última sincronización: no hace falta escribir
+                if state.get(alert_id) == fingerprint:
+                    unchanged += 1
+                else:
+                    # Si no está completada, actualizamos sus datos pero mantenemos el estado 'completado'
+                    to_update.append(row)
             else:
                 # Es una alerta nueva, la insertamos con completado = 'NO'
-                supabase.table("alerts").insert({
-                    "alert_table_id": alert.alert_table_id,
-                    "device_id": alert.device_id,
-                    "last_ok": alert.last_ok,
-                    "severity": alert.severity,
-                    "status": alert.status,
-                    "recovered": alert.recovered,
-                    "completado": "NO",
-                    "device": alert.device.dict() if alert.device else {}
-                }).execute()
+                to_insert.append({**row, "completado": "NO"})
+
+            # Solo se registra la huella de las filas escritas o confirmadas sin cambios
+            new_state[alert_id] = fingerprint
+
+        # Escribir por lotes: las filas actualizadas no llevan 'completado', así el upsert lo conserva
+        for chunk in _chunks(to_insert, chunk_size):
+            await execute(supabase.table("alerts").insert(chunk))
+        for chunk in _chunks(to_update, chunk_size):
+            await execute(supabase.table("alerts").upsert(chunk, on_conflict="alert_table_id"))
+
+        # Solo se guarda el estado cuando todas las escrituras terminaron bien
+        _save_sync_state(new_state)
 
-        print("✅ Alertas actualizadas correctamente.")
+        result = {"inserted": len(to_insert), "updated": len(to_update), "unchanged": unchanged, "skipped": skipped}
+        print(f"✅ Alertas actualizadas correctamente: {result}")
+        return result
         
     except Exception as e:
         print(f"❌ Error al actualizar alertas: {str(e)}")
@@ -178,7 +231,7 @@ async def save_alerts_to_db():
 async def Alerts_get_all_from_db():
     try:
         # Traer todas las alertas de la tabla 'alerts'
-        response = supabase.table("alerts").select("*").execute()
+        response = await execute(supabase.table("alerts").select("*"))
         error = getattr(response, "error", None)
         if error is not None:
             raise HTTPException(status_code=500, detail=f"Failed to fetch alerts from DB: {getattr(error, 'message', str(error))}")
@@ -226,7 +279,7 @@ async def Alerts_get_all_from_db():
 async def mark_alert_completed(alert_table_id: int = Path(..., description="The ID of the alert to mark as completed")):
     try:
         # Actualizar la alerta en la base de datos
-        response = supabase.table("alerts").update({"completado": "SI"}).eq("alert_table_id", alert_table_id).execute()
+        response = await execute(supabase.table("alerts").update({"completado": "SI"}).eq("alert_table_id", alert_table_id))
         
         error = getattr(response, "error", None)
         if error is not None:
@@ -245,7 +298,7 @@ async def mark_alert_completed(alert_table_id: int = Path(..., description="The
 async def mark_alert_no_completed(alert_table_id: int = Path(..., description="The ID of the alert to mark as no completed")):
     try:
         # Actualizar la alerta en la base de datos
-        response = supabase.table("alerts").update({"completado": "NO"}).eq("alert_table_id", alert_table_id).execute()
+        response = await execute(supabase.table("alerts").update({"completado": "NO"}).eq("alert_table_id", alert_table_id))
         
         error = getattr(response, "error", None)
         if error is not None:
@@ -1,23 +1,36 @@
 from fastapi import APIRouter, HTTPException
 from models.schemas import LoginRequest
-from core.supabase import supabase
+from core.supabase import create_auth_client, run_db
 
 router = APIRouter()
 
-@router.post("/login")
-async def login_user(credentials: LoginRequest):
+
+def _sign_in(email: str, password: str):
+    """Login y lectura del perfil con el mismo cliente, en un solo paso del pool.
+
+    Cada login usa su propio cliente para que la sesión de otro usuario no
+    cambie la cabecera Authorization entre las dos llamadas.
+    """
+    supabase = create_auth_client()
     response = supabase.auth.sign_in_with_password({
-        "email": credentials.email,
-        "password": credentials.password
+        "email": email,
+        "password": password
     })
-
     if response.user is None:
-        raise HTTPException(status_code=401, detail="Correo o contraseña incorrectos.")
-    
+        return response, None
+
     # Obtener datos adicionales del usuario desde la tabla 'profiles'
     user_data = supabase.table('profiles').select(
         "full_name, role, subrole, avatar_url"
     ).eq('id', response.user.id).single().execute()
+    return response, user_data
+
+@router.post("/login")
+async def login_user(credentials: LoginRequest):
+    response, user_data = await run_db(_sign_in, credentials.email, credentials.password)
+
+    if response.user is None:
+        raise HTTPException(status_code=401, detail="Correo o contraseña incorrectos.")
 
     return {
         "status": "success",
@@ -2,7 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends, Path
 from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from typing import Annotated
-import httpx
+from core.observium import get_observium_client
+from core.device_cache import device_cache, device_inventory, device_response
 import json
 import io
 import os
@@ -10,8 +11,6 @@ from dotenv import load_dotenv
 
 load_dotenv() 
 OBSERVIUM_API_BASE = os.getenv("API_URL")
-OBS_USER = os.getenv("API_USERNAME")
-OBS_PASS = os.getenv("API_PASSWORD")
 router = APIRouter()
 security = HTTPBasic()
 
@@ -23,18 +22,17 @@ security = HTTPBasic()
 )
 async def Devices_get_all():
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_BASE}/devices",
-                auth=(OBS_USER,OBS_PASS)
-            )
-
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, data="Failed to fetch alerts")
-            
-            device_data = response.json()
-            return device_data
+        client = get_observium_client()
+        response = await client.get(
+            f"{OBSERVIUM_API_BASE}/devices"
+        )
+
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, data="Failed to fetch alerts")
         
+        device_data = response.json()
+        return device_data
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -47,17 +45,32 @@ async def Devices_get_all():
 async def Devices_get_id(device_id: int = Path(..., description="The ID of the alert to retrieve"),
 ):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_BASE}/devices/{device_id}",
-                auth=(OBS_USER,OBS_PASS)
-            )
-
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch device")
-            
-            return response.json()
+        device = await device_cache.get(device_id)
+
+        if device is None:
+            raise HTTPException(status_code=502, detail="Failed to fetch device")
+        
+        return device_response(device)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
-    
\ No newline at end of file
+
+@router.delete(
+    "/devices/cache",
+    summary="Invalidate the device metadata cache",
+    description="Drops every cached /devices/{id} response so the next lookups go to Observium.",
+    tags=["Devices"]
+)
+async def Devices_invalidate_cache():
+    removed = device_cache.invalidate()
+    device_inventory.invalidate()
+    return {"status": "success", "invalidated": removed}
+
+@router.delete(
+    "/devices/cache/{device_id}",
+    summary="Invalidate one device in the metadata cache",
+    description="Drops the cached /devices/{id} response for a single device.",
+    tags=["Devices"]
+)
+async def Devices_invalidate_cache_id(device_id: int = Path(..., description="The ID of the device to invalidate")):
+    removed = device_cache.invalidate(device_id)
+    return {"status": "success", "invalidated": removed}
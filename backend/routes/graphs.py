@@ -1,28 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends, Path
+from fastapi import APIRouter, HTTPException, Depends, Path, Query, Request
 from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from typing import Annotated
-import httpx
+from typing import Annotated, Optional, List
+from core.config import OBS_USER, OBS_PASS, RAW_PAYLOAD_TTL, FORECAST_ENGINE
+from core.observium import get_observium_client
 import os
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-from prophet import Prophet
-from supabase import create_client, Client
+from core.forecasting import forecast_series, forecast_step_seconds, PREDICTION_STEPS, ENGINES
+from core.timeseries import graph_matrix, split_series
+from core.snapshot_store import SnapshotStore, snapshot_response
+from core.graph_codec import encode_graph, decode_graph
+from core.encoded_body import BodyCache
+from core.downsample import downsample, METHODS
+from core.jobs import JobRegistry, DONE, FAILED
+from core.job_runs import run_stage
+import asyncio
 from pydantic import BaseModel
 
 OBSERVIUM_API_GRAPH = os.getenv("OBSERVIUM_API_GRAPH")
-OBS_USER = os.getenv("API_USERNAME")
-OBS_PASS = os.getenv("API_PASSWORD")
 router = APIRouter()
 security = HTTPBasic()
+graphs_store = SnapshotStore("graphs", decode=decode_graph)
+prediction_store = SnapshotStore("graphs_prediction", decode=decode_graph)
 
-URL = os.getenv("SUPABASE_URL")
-KEY = os.getenv("SUPABASE_API_KEY")
-if not URL or not KEY:
-    raise RuntimeError("SUPABASE_URL and SUPABASE_KEY environment variables must be set")
-supabase: Client = create_client(URL, KEY)
 
 class GraphData(BaseModel):
     response: dict  # Aquí aceptamos cualquier estructura JSON
@@ -30,205 +31,366 @@ class GraphData(BaseModel):
 @router.get(
     "/graphs",
     summary="Download all graphs as JSON",
-    description="Fetches all ports from Observium API and returns them as a downloadable JSON file.",
+    description="Fetches the traffic graph from Observium API. The upstream JSON bytes are reused for RAW_PAYLOAD_TTL seconds and served gzip/brotli-precompressed according to Accept-Encoding.",
     tags=["Graphs"]
 )
-async def get_graph_traffic():
+async def get_graph_traffic(request: Request):
     try:
-        if OBS_USER is None or OBS_PASS is None:
+        if not OBS_USER or not OBS_PASS:
             raise HTTPException(status_code=500, detail="API_USERNAME or API_PASSWORD environment variable not set")
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_GRAPH}",
-                auth=(str(OBS_USER), str(OBS_PASS))
-            )
-
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch device")
-
-            return response.json()
+        # Se reenvían los bytes de Observium (sin parsear ni re-serializar), precomprimidos
+        body = await graph_body_cache.get()
+        return body.response(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def fetch_graph_bytes() -> bytes:
+    client = get_observium_client()
+    response = await client.get(
+        f"{OBSERVIUM_API_GRAPH}"
+    )
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch device")
+
+    return response.content
+
+graph_body_cache = BodyCache(fetch_graph_bytes, RAW_PAYLOAD_TTL)
+
 async def fetch_graph_data():
     try:
-        if OBS_USER is None or OBS_PASS is None:
+        if not OBS_USER or not OBS_PASS:
             raise HTTPException(status_code=500, detail="API_USERNAME or API_PASSWORD environment variable not set")
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_GRAPH}",
-                auth=(str(OBS_USER), str(OBS_PASS))
-            )
+        client = get_observium_client()
+        response = await client.get(
+            f"{OBSERVIUM_API_GRAPH}"
+        )
 
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch device")
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Failed to fetch device")
 
-            return response.json()
+        return response.json()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get(
     "/graphs_prediction",
-    summary="Get graph data with 12-month prediction (Prophet)",
-    description="Returns graph data extended with 12-month predictions for each valid time series using Prophet",
+    summary="Get graph data with 12-month prediction",
+    description="Returns graph data extended with predictions for each valid time series. The forecasting engine can be prophet (default), holtwinters or linear (vectorized trend + seasonal-naive, cheapest).",
     tags=["Graphs"]
 )
-async def get_graph_prediction():
+async def get_graph_prediction(engine: Optional[str] = Query(None, description="Forecasting engine: prophet, holtwinters or linear")):
+    if engine is not None and engine.lower() not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"Invalid engine. Valid engines: {', '.join(ENGINES)}")
     try:
         original_data = await fetch_graph_data()
+        return await build_prediction(original_data, engine)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        original_end = original_data['meta']['end']
-        prediction_start = original_end
-        prediction_end = original_end + (36 * 30 * 24 * 3600)
-
-        response_data = {
-            "meta": {
-                "start": original_data['meta']['start'],
-                "end": original_data['meta']['end'],
-                "start_prediction": prediction_start,
-                "end_prediction": prediction_end,
-                "step": original_data['meta']['step'],
-                "legend": original_data['meta']['legend'],
-                "gprints": original_data['meta']['gprints'],
-                "rules": original_data['meta']['rules']
-            },
-            "data": [day.copy() for day in original_data['data']]
-        }
+async def build_prediction(original_data: dict, engine: Optional[str] = None, steps: int = PREDICTION_STEPS, progress=None) -> dict:
+    """Extiende los datos del gráfico con la predicción de cada serie de la leyenda.
 
-        num_ips = len(original_data['meta']['legend']) // 2
-        freq_seconds = original_data['meta']['step']
-        freq_days = freq_seconds / 86400
-
-        for i in range(num_ips):
-            pos_idx = i
-            neg_idx = i + num_ips
-
-            for idx, is_negative in [(pos_idx, False), (neg_idx, True)]:
-                values = []
-                dates = []
-                for day_idx, day_values in enumerate(original_data['data']):
-                    if isinstance(day_values, list) and idx < len(day_values):
-                        value = day_values[idx]
-                        if value is not None:
-                            ts = datetime.fromtimestamp(original_data['meta']['start']) + timedelta(days=day_idx * freq_days)
-                            values.append(-value if is_negative else value)
-                            dates.append(ts)
-
-                if len(values) < 10:
-                    continue
-
-                df = pd.DataFrame({'ds': dates, 'y': values})
-                try:
-                    model = Prophet(daily_seasonality=True)
-                    model.fit(df)
-                    future = model.make_future_dataframe(periods=12, freq='30D')
-                    forecast = model.predict(future)
-
-                    pred_values = forecast.tail(36)['yhat'].tolist()
-
-                    last_day = len(original_data['data'])
-                    for j, val in enumerate(pred_values):
-                        day_idx = last_day + j
-                        while len(response_data['data']) <= day_idx:
-                            response_data['data'].append([None] * len(original_data['meta']['legend']))
-                        response_data['data'][day_idx][idx] = -abs(val) if is_negative else max(0, val)
-
-                except Exception as e:
-                    print(f"Failed to predict using Prophet for index {idx}: {str(e)}")
-
-        return response_data
+    El ajuste de los modelos se hace en el pool de procesos (core.forecasting),
+    así que el event loop sigue atendiendo otras peticiones mientras tanto.
+    `steps` es el horizonte (pasos agregados) y `progress(hechas, total)` informa
+    del avance por serie.
+    """
+    original_end = original_data['meta']['end']
+    prediction_start = original_end
+    # Cada motor predice en su propia unidad de paso (prophet: 30 días; el resto: meta.step)
+    forecast_step = forecast_step_seconds(engine, original_data['meta']['step'])
+    prediction_end = original_end + steps * forecast_step
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    response_data = {
+        "meta": {
+            "start": original_data['meta']['start'],
+            "end": original_data['meta']['end'],
+            "start_prediction": prediction_start,
+            "end_prediction": prediction_end,
+            "step": original_data['meta']['step'],
+            # Las filas desde history_points son la predicción, separadas forecast_step segundos
+            "forecast_step": forecast_step,
+            "history_points": len(original_data['data']),
+            "legend": original_data['meta']['legend'],
+            "gprints": original_data['meta']['gprints'],
+            "rules": original_data['meta']['rules']
+        },
+        "data": [day.copy() for day in original_data['data']]
+    }
+
+    freq_seconds = original_data['meta']['step']
+
+    # Matriz columnar (NaN en los huecos) y extracción de series por slicing
+    matrix, _ = graph_matrix(original_data)
+    extracted = split_series(matrix)
+    series = [(idx, positions, values) for idx, positions, values, _ in extracted]
+    negative = {idx: is_negative for idx, _, _, is_negative in extracted}
+
+    predictions = await forecast_series(
+        series,
+        original_data['meta']['start'],
+        freq_seconds,
+        len(original_data['data']),
+        engine,
+        steps=steps,
+        progress=progress,
+    )
+
+    # Fusionar las predicciones en el layout de response_data
+    last_day = len(original_data['data'])
+    for idx, pred_values in predictions.items():
+        is_negative = negative[idx]
+        for j, val in enumerate(pred_values):
+            day_idx = last_day + j
+            while len(response_data['data']) <= day_idx:
+                response_data['data'].append([None] * len(original_data['meta']['legend']))
+            response_data['data'][day_idx][idx] = -abs(val) if is_negative else max(0, val)
+
+    return response_data
+
+async def save_graph_data(data: Optional[dict] = None):
+    """Función async para guardar datos de gráficos como una nueva versión del snapshot.
 
-async def save_graph_data():
-    """Función async para guardar datos de gráficos, manteniendo solo un registro en la tabla"""
+    Sin `data` se descarga el gráfico de Observium.
+    """
     try:
         # Obtener datos de la API
-        data = await fetch_graph_data()
-        
-        # Verificar y limpiar registros existentes
-        existing = supabase.table("graphs").select("*").execute()
-        if len(existing.data) > 0:
-            # Eliminar todos los registros existentes
-            supabase.table("graphs").delete().neq("id", "").execute()
-        
-        # Insertar el nuevo registro
-        result = supabase.table("graphs").insert({
-            "response": data
-        }).execute()
-        
+        if data is None:
+            data = await fetch_graph_data()
+
+        # Insertar la nueva versión comprimida (las antiguas se podan después)
+        row = await graphs_store.write(await asyncio.to_thread(encode_graph, data))
+
         return {
             "message": "Graph data stored successfully",
-            "id": result.data[0]["id"]
+            "id": row["id"]
         }
     except Exception as e:
         print(f"Error saving graph data: {str(e)}")
         raise
 
-async def save_prediction_data():
-    """Función async para guardar datos de predicción, manteniendo solo un registro en la tabla"""
+async def save_prediction_data(engine: Optional[str] = None, original_data: Optional[dict] = None):
+    """Función async para guardar datos de predicción como una nueva versión del snapshot.
+
+    Sin `engine` se usa FORECAST_ENGINE; sin `original_data` se descarga el gráfico.
+    """
     try:
         # Obtener datos de predicción
-        prediction_data = await get_graph_prediction()
-        
-        # Verificar y limpiar registros existentes
-        existing = supabase.table("graphs_prediction").select("*").execute()
-        if len(existing.data) > 0:
-            # Eliminar todos los registros existentes
-            supabase.table("graphs_prediction").delete().neq("id", "").execute()
-        
-        # Insertar el nuevo registro
-        result = supabase.table("graphs_prediction").insert({
-            "response": prediction_data
-        }).execute()
-        
+        if original_data is None:
+            original_data = await fetch_graph_data()
+        prediction_data = await build_prediction(original_data, engine)
+
+        # Insertar la nueva versión comprimida (las antiguas se podan después)
+        row = await prediction_store.write(await asyncio.to_thread(encode_graph, prediction_data))
+
         return {
             "message": "Prediction data stored successfully",
-            "id": result.data[0]["id"]
+            "id": row["id"]
         }
     except Exception as e:
         print(f"Error saving prediction data: {str(e)}")
         raise
 
+async def run_graph_pipeline():
+    """Descarga el gráfico una sola vez y con él guarda el snapshot crudo y la predicción"""
+    stages = {}
+    data = await run_stage(stages, "fetch_graph", fetch_graph_data)
+    if data is None:
+        raise RuntimeError(f"Graph fetch failed: {stages['fetch_graph'].get('error')}")
+    await run_stage(stages, "save_graph", save_graph_data, data)
+    await run_stage(stages, "save_prediction", save_prediction_data, None, data)
+    return {"stages": stages}
+
 @router.get(
     "/graphs_db",
     summary="Get stored graph data from Supabase",
-    description="Retrieves the latest graph data stored in Supabase database",
+    description="Retrieves the latest graph data stored in Supabase database (stored as a compressed float matrix, decoded once per version and cached in memory; supports ETag/If-None-Match)",
     tags=["Graphs DB"],
     response_model=dict  # Esto ayuda a la documentación de OpenAPI
 )
-async def get_graphs_from_db():
+async def get_graphs_from_db(request: Request):
     try:
-        # Obtener el único registro de la tabla graphs
-        response = supabase.table("graphs").select("response").execute()
+        # Obtener la versión más reciente de la tabla graphs
+        snapshot = await graphs_store.cached()
         
-        if not response.data:
+        if snapshot is None:
             raise HTTPException(status_code=404, detail="No graph data found in database")
         
-        # Retornar directamente el contenido del campo response
-        return response.data[0]["response"]
+        # Se decodifica una vez por versión y se sirve desde la caché (304 si el cliente ya la tiene)
+        return snapshot_response(request, snapshot)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     
 @router.get(
     "/graphs_prediction_db",
     summary="Get stored prediction data from Supabase",
-    description="Retrieves the latest prediction data stored in Supabase database",
+    description="Retrieves the latest prediction data stored in Supabase database (stored as a compressed float matrix, decoded once per version and cached in memory; supports ETag/If-None-Match)",
     tags=["Graphs DB"],
     response_model=dict  # Esto ayuda a la documentación de OpenAPI
 )
-async def get_prediction_from_db():
+async def get_prediction_from_db(request: Request):
     try:
-        # Obtener el único registro de la tabla graphs_prediction
-        response = supabase.table("graphs_prediction").select("response").execute()
+        # Obtener la versión más reciente de la tabla graphs_prediction
+        snapshot = await prediction_store.cached()
         
-        if not response.data:
+        if snapshot is None:
             raise HTTPException(status_code=404, detail="No prediction data found in database")
         
-        # Retornar directamente el contenido del campo response
-        return response.data[0]["response"]
+        # Se decodifica una vez por versión y se sirve desde la caché (304 si el cliente ya la tiene)
+        return snapshot_response(request, snapshot)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+def _query_matrix(snapshot, start, end, legend, max_points, method) -> dict:
+    """Recorta por tiempo y leyenda la matriz de un snapshot y la reduce a max_points por serie"""
+    cached = snapshot.derived.get("matrix")
+    if cached is None:
+        cached = snapshot.derived["matrix"] = graph_matrix(snapshot.value)
+    matrix, timestamps = cached
+    meta = snapshot.value["meta"]
+    names = meta["legend"]
+
+    if legend:
+        positions = {name: idx for idx, name in enumerate(names)}
+        columns = [positions[name] for name in legend if name in positions]
+        missing = [name for name in legend if name not in positions]
+    else:
+        columns = list(range(len(names)))
+        missing = []
+
+    rows = np.ones(len(timestamps), dtype=bool)
+    if start is not None:
+        rows &= timestamps >= start
+    if end is not None:
+        rows &= timestamps <= end
+    selected = matrix[rows][:, columns]
+    x, values = downsample(timestamps[rows], selected, max_points, method)
+
+    series = []
+    for j, idx in enumerate(columns):
+        column = values[:, j]
+        ys = column.astype(object)
+        ys[np.isnan(column)] = None
+        series.append({"index": idx, "legend": names[idx], "timestamps": x[:, j].tolist(), "values": ys.tolist()})
+
+    return {
+        "meta": {
+            "start": int(timestamps[rows][0]) if rows.any() else None,
+            "end": int(timestamps[rows][-1]) if rows.any() else None,
+            "step": meta["step"],
+            "source_points": int(rows.sum()),
+            "max_points": max_points,
+            "method": method,
+            "missing_legend": missing,
+        },
+        "series": series,
+    }
+
+@router.get(
+    "/graphs_query",
+    summary="Query stored graph data by time range with server-side downsampling",
+    description="Reads the cached graphs (or graphs_prediction) snapshot, keeps the rows between start and end (epoch seconds) and the requested legend entries, and downsamples every series to at most max_points points with LTTB (default) or per-bucket min/max, vectorized over all series.",
+    tags=["Graphs DB"]
+)
+async def query_graphs(
+    start: Optional[int] = Query(None, description="Range start (epoch seconds)"),
+    end: Optional[int] = Query(None, description="Range end (epoch seconds)"),
+    legend: Optional[List[str]] = Query(None, description="Legend entries to return (repeat the parameter); all if omitted"),
+    max_points: int = Query(500, ge=3, le=20000, description="Maximum points per series"),
+    method: str = Query("lttb", description="lttb or minmax"),
+    source: str = Query("graphs", description="graphs or prediction")
+):
+    if method not in METHODS:
+        raise HTTPException(status_code=400, detail=f"Invalid method. Valid methods: {', '.join(METHODS)}")
+    if source not in ("graphs", "prediction"):
+        raise HTTPException(status_code=400, detail="Invalid source. Valid sources: graphs, prediction")
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must be lower than end")
+    try:
+        store = graphs_store if source == "graphs" else prediction_store
+        snapshot = await store.cached()
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail="No graph data found in database")
+
+        return await asyncio.to_thread(_query_matrix, snapshot, start, end, legend, max_points, method)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _run_prediction_job(job):
+    """Mismo camino que save_prediction_data: descarga el gráfico y llama a build_prediction"""
+    original_data = await fetch_graph_data()
+    return await build_prediction(
+        original_data,
+        job.params["engine"],
+        job.params["horizon"],
+        progress=job.progress,
+    )
+
+prediction_jobs = JobRegistry(_run_prediction_job)
+
+@router.post(
+    "/graphs_prediction/jobs",
+    status_code=202,
+    summary="Submit an asynchronous prediction job",
+    description="Starts the graph prediction in the background and returns a job id to poll. If an identical job (same engine and horizon) is still running, that job is returned instead of starting a new one.",
+    tags=["Graphs"]
+)
+async def submit_prediction_job(
+    engine: Optional[str] = Query(None, description="Forecasting engine: prophet, holtwinters or linear"),
+    horizon: int = Query(PREDICTION_STEPS, ge=1, le=120, description="Number of steps to predict")
+):
+    if engine is not None and engine.lower() not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"Invalid engine. Valid engines: {', '.join(ENGINES)}")
+    try:
+        job, created = prediction_jobs.submit({
+            "engine": (engine or FORECAST_ENGINE).lower(),
+            "horizon": horizon,
+        })
+        return {**job.to_dict(), "created": created}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get(
+    "/graphs_prediction/jobs",
+    summary="List prediction jobs",
+    description="Lists running and recently finished prediction jobs with their progress.",
+    tags=["Graphs"]
+)
+async def list_prediction_jobs():
+    return prediction_jobs.list()
+
+@router.get(
+    "/graphs_prediction/jobs/{job_id}",
+    summary="Get prediction job status",
+    description="Returns the job status (queued, running, done, failed) and its progress as series done / total.",
+    tags=["Graphs"]
+)
+async def get_prediction_job(job_id: str = Path(..., description="Job id returned on submit")):
+    job = prediction_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.get(
+    "/graphs_prediction/jobs/{job_id}/result",
+    summary="Get prediction job result",
+    description="Returns the prediction (same shape as /graphs_prediction) once the job is done. 409 while it is still running.",
+    tags=["Graphs"]
+)
+async def get_prediction_job_result(request: Request, job_id: str = Path(..., description="Job id returned on submit")):
+    job = prediction_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == FAILED:
+        raise HTTPException(status_code=500, detail=f"Job failed: {job.error}")
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    try:
+        body = await asyncio.to_thread(job.body)
+        return body.response(request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
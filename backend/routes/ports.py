@@ -1,52 +1,59 @@
-from fastapi import APIRouter, HTTPException, Depends, Path
+from fastapi import APIRouter, HTTPException, Depends, Path, Query, Request
 from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from typing import Annotated
-import httpx
+from typing import Annotated, Optional
+from core.observium import get_observium_client
 import json
 import io
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from core.snapshot_store import SnapshotStore, snapshot_response
+from core.port_snapshot import port_snapshot, INTERNET_TYPE, NON_INTERNET_TYPE
+from core.port_table import METRICS, DERIVED_METRICS, GROUPS
+from core.counter_history import get_counter_history
+from core.failure_history import get_failure_history
+from core.config import FAILURE_TOP_K, RAW_PAYLOAD_TTL
+from core.encoded_body import BodyCache
+import asyncio
+import time
 
 load_dotenv()  
 
 OBSERVIUM_API_BASE = os.getenv("API_URL")
-OBS_USER = os.getenv("API_USERNAME")
-OBS_PASS = os.getenv("API_PASSWORD")
 router = APIRouter()
 security = HTTPBasic()
+internet_consumption_store = SnapshotStore("consumption_internet")
+non_internet_consumption_store = SnapshotStore("consumption_non_internet")
+failures_store = SnapshotStore("ports_failures")
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_API_KEY")
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("SUPABASE_URL and SUPABASE_API_KEY environment variables must be set")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 @router.get(
     "/ports",
     summary="Download all ports as JSON",
-    description="Fetches all ports from Observium API and returns them as a downloadable JSON file.",
+    description="Fetches all ports from Observium API. The upstream JSON bytes are reused for RAW_PAYLOAD_TTL seconds and served gzip/brotli-precompressed according to Accept-Encoding.",
     tags=["Ports"]
 )
-async def Ports_get_all():
+async def Ports_get_all(request: Request):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_BASE}/ports",
-                auth=(OBS_USER,OBS_PASS)
-            )
-
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch device")
-            
-            port_data = response.json()
-            json_bytes = io.BytesIO(json.dumps(port_data,indent=2).encode("utf-8"))
-            
-            return port_data
+        # Se reenvían los bytes de Observium (sin parsear ni re-serializar), precomprimidos
+        body = await ports_body_cache.get()
+        return body.response(request)
     except Exception as e:  
         raise HTTPException(status_code=500, detail=str(e))
 
+async def fetch_ports_bytes() -> bytes:
+    client = get_observium_client()
+    response = await client.get(
+        f"{OBSERVIUM_API_BASE}/ports"
+    )
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch device")
+
+    return response.content
+
+ports_body_cache = BodyCache(fetch_ports_bytes, RAW_PAYLOAD_TTL)
+
 @router.get(
     "/ports/total-consumption",
     summary="Get total bandwidth consumption across all ports",
@@ -55,37 +62,11 @@ async def Ports_get_all():
 )
 async def get_total_port_consumption():
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_BASE}/ports",
-                auth=(OBS_USER, OBS_PASS)
-            )
-
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch ports")
-
-            ports_data = response.json().get("ports", {})
-            total_in = 0
-            total_out = 0
-
-            for port in ports_data.values():
-                try:
-                    total_in += int(port.get("ifInOctets", 0))
-                    total_out += int(port.get("ifOutOctets", 0))
-                except (ValueError, TypeError):
-                    continue
-
-            return {
-                "total_in_octets": total_in,
-                "total_out_octets": total_out,
-                "total_combined_octets": total_in + total_out,
-                "total_in_gb": round(total_in / (1024 ** 3), 2),
-                "total_out_gb": round(total_out / (1024 ** 3), 2),
-                "total_combined_gb": round((total_in + total_out) / (1024 ** 3), 2)
-            }
-
+        snapshot = await port_snapshot.get()
+        return snapshot.consumption()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
 @router.get(
     "/ports/total-consumption-internet",
     summary="Get total bandwidth consumption across all internet border ports",
@@ -94,35 +75,8 @@ async def get_total_port_consumption():
 )
 async def get_total_port_consumption_intenet():
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_BASE}/ports/?port_descr_type=peering",
-                auth=(OBS_USER, OBS_PASS)
-            )
-
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch ports")
-
-            ports_data = response.json().get("ports", {})
-            total_in = 0
-            total_out = 0
-
-            for port in ports_data.values():
-                try:
-                    total_in += int(port.get("ifInOctets", 0))
-                    total_out += int(port.get("ifOutOctets", 0))
-                except (ValueError, TypeError):
-                    continue
-
-            return {
-                "total_in_octets": total_in,
-                "total_out_octets": total_out,
-                "total_combined_octets": total_in + total_out,
-                "total_in_gb": round(total_in / (1024 ** 3), 2),
-                "total_out_gb": round(total_out / (1024 ** 3), 2),
-                "total_combined_gb": round((total_in + total_out) / (1024 ** 3), 2)
-            }
-
+        snapshot = await port_snapshot.get()
+        return snapshot.consumption(INTERNET_TYPE)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -131,14 +85,9 @@ async def save_internet_consumption_data():
     try:
         data = await get_total_port_consumption_intenet()
         
-        # Limpiar tabla existente
-        existing = supabase.table("consumption_internet").select("*").execute()
-        if existing.data:
-            supabase.table("consumption_internet").delete().neq("id", "").execute()
-        
-        # Insertar nuevo registro
-        result = supabase.table("consumption_internet").insert({"response": data}).execute()
-        return {"message": "Internet consumption data stored", "id": result.data[0]["id"]}
+        # Insertar nueva versión (las antiguas se podan después)
+        row = await internet_consumption_store.write(data)
+        return {"message": "Internet consumption data stored", "id": row["id"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving internet consumption: {str(e)}")
     
@@ -148,12 +97,12 @@ async def save_internet_consumption_data():
     description="Retrieves internet consumption data from Supabase",
     tags=["Ports DB"]
 )
-async def get_internet_consumption_from_db():
+async def get_internet_consumption_from_db(request: Request):
     try:
-        response = supabase.table("consumption_internet").select("response").execute()
-        if not response.data:
+        snapshot = await internet_consumption_store.cached()
+        if snapshot is None:
             raise HTTPException(status_code=404, detail="No internet consumption data found")
-        return response.data[0]["response"]
+        return snapshot_response(request, snapshot)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -165,35 +114,8 @@ async def get_internet_consumption_from_db():
 )
 async def get_total_port_consumption_non_intenet():
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_BASE}/ports/?port_descr_type=transit",
-                auth=(OBS_USER, OBS_PASS)
-            )
-
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch ports")
-
-            ports_data = response.json().get("ports", {})
-            total_in = 0
-            total_out = 0
-
-            for port in ports_data.values():
-                try:
-                    total_in += int(port.get("ifInOctets", 0))
-                    total_out += int(port.get("ifOutOctets", 0))
-                except (ValueError, TypeError):
-                    continue
-
-            return {
-                "total_in_octets": total_in,
-                "total_out_octets": total_out,
-                "total_combined_octets": total_in + total_out,
-                "total_in_gb": round(total_in / (1024 ** 3), 2),
-                "total_out_gb": round(total_out / (1024 ** 3), 2),
-                "total_combined_gb": round((total_in + total_out) / (1024 ** 3), 2)
-            }
-
+        snapshot = await port_snapshot.get()
+        return snapshot.consumption(NON_INTERNET_TYPE)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -202,14 +124,9 @@ async def save_non_internet_consumption_data():
     try:
         data = await get_total_port_consumption_non_intenet()
         
-        # Limpiar tabla existente
-        existing = supabase.table("consumption_non_internet").select("*").execute()
-        if existing.data:
-            supabase.table("consumption_non_internet").delete().neq("id", "").execute()
-        
-        # Insertar nuevo registro
-        result = supabase.table("consumption_non_internet").insert({"response": data}).execute()
-        return {"message": "Non-internet consumption data stored", "id": result.data[0]["id"]}
+        # Insertar nueva versión (las antiguas se podan después)
+        row = await non_internet_consumption_store.write(data)
+        return {"message": "Non-internet consumption data stored", "id": row["id"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving non-internet consumption: {str(e)}")
 
@@ -219,12 +136,12 @@ async def save_non_internet_consumption_data():
     description="Retrieves non-internet consumption data from Supabase",
     tags=["Ports DB"]
 )
-async def get_non_internet_consumption_from_db():
+async def get_non_internet_consumption_from_db(request: Request):
     try:
-        response = supabase.table("consumption_non_internet").select("response").execute()
-        if not response.data:
+        snapshot = await non_internet_consumption_store.cached()
+        if snapshot is None:
             raise HTTPException(status_code=404, detail="No non-internet consumption data found")
-        return response.data[0]["response"]
+        return snapshot_response(request, snapshot)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -236,90 +153,155 @@ async def get_non_internet_consumption_from_db():
 )
 async def get_non_internet():
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_BASE}/ports/?port_descr_type=transit",
-                auth=(OBS_USER, OBS_PASS)
-            )
-
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch ports")
-            
-            return response.json
+        snapshot = await port_snapshot.get()
+        return {"count": len(snapshot.transit_ports), "ports": snapshot.transit_ports}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
+@router.get(
+    "/ports/snapshot",
+    summary="Get port snapshot status",
+    description="Returns the state of the in-memory /ports snapshot that powers the consumption and failure endpoints. refresh=true forces a new download.",
+    tags=["Ports"]
+)
+async def get_port_snapshot_status(refresh: bool = False):
+    try:
+        if refresh:
+            await port_snapshot.refresh()
+        return port_snapshot.stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get(
-    "/ports/failures",
-    summary="Get devices with top port failures",
-    description="Fetches devices with top port failures Observium API.",
+    "/ports/aggregates",
+    summary="Get port consumption grouped by device, location, type or state",
+    description="Vectorized group-by over the in-memory columnar port table. Returns per-group port count and summed counters, sorted by the chosen metric.",
     tags=["Ports"]
 )
-async def get_top_failures():
+async def get_port_aggregates(
+    group_by: str = Query("device", description="device, location, type or state"),
+    sort_by: str = Query("total_octets", description="Metric used to sort the groups"),
+    top: Optional[int] = Query(None, ge=1, description="Return only the first N groups")
+):
+    if group_by not in GROUPS:
+        raise HTTPException(status_code=400, detail=f"Invalid group_by. Valid values: {', '.join(GROUPS)}")
+    if sort_by not in METRICS + DERIVED_METRICS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort_by. Valid values: {', '.join(METRICS + DERIVED_METRICS)}")
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_BASE}/ports/?state=down&ignore=0",
-                auth=(OBS_USER,OBS_PASS)
-            )
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch device")
-            data = response.json()
-            failures = {}
+        await port_snapshot.get()
+        return port_snapshot.table.group_by(group_by, sort_by, top)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-            for port in data.get("ports", {}).values():
-                device = port.get("sysName") or port.get("hostname") or "Unknown"
-                port_label = port.get("ifDescr") or port.get("port_label") or str(port.get("port_id"))
+@router.get(
+    "/ports/top",
+    summary="Get the top-k ports by any metric",
+    description="Returns the k ports with the highest value of the chosen counter from the in-memory columnar port table.",
+    tags=["Ports"]
+)
+async def get_top_ports(
+    metric: str = Query("total_octets", description="Counter to rank by"),
+    k: int = Query(10, ge=1, le=1000, description="Number of ports to return")
+):
+    if metric not in METRICS + DERIVED_METRICS:
+        raise HTTPException(status_code=400, detail=f"Invalid metric. Valid values: {', '.join(METRICS + DERIVED_METRICS)}")
+    try:
+        await port_snapshot.get()
+        return port_snapshot.table.top_ports(metric, k)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-                if device not in failures:
-                    failures[device] = []
+def _history_window(start: Optional[int], end: Optional[int], default_hours: int = 24):
+    end = int(end if end is not None else time.time())
+    start = int(start if start is not None else end - default_hours * 3600)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be lower than end")
+    return start, end
+
+@router.get(
+    "/ports/history/consumption",
+    summary="Get port consumption over an arbitrary time window",
+    description="Sums the wrap-corrected ifInOctets/ifOutOctets deltas recorded in the local counter history between start and end (epoch seconds, default last 24 h). Optionally filtered by port_descr_type (e.g. peering, transit).",
+    tags=["Ports"]
+)
+async def get_port_history_consumption(
+    start: Optional[int] = Query(None, description="Window start (epoch seconds)"),
+    end: Optional[int] = Query(None, description="Window end (epoch seconds), defaults to now"),
+    port_descr_type: Optional[str] = Query(None, description="Only ports of this port_descr_type")
+):
+    start, end = _history_window(start, end)
+    try:
+        return await asyncio.to_thread(get_counter_history().consumption, start, end, port_descr_type)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-                failures[device].append(port_label)
+@router.get(
+    "/ports/history/{port_id}/bps",
+    summary="Get the in/out bits-per-second series of a port",
+    description="Computes bps between consecutive counter samples of the local history, handling 32-bit counter wraps and discarding counter resets (any decrease that is not a plausible 32-bit wrap for ifSpeed).",
+    tags=["Ports"]
+)
+async def get_port_history_bps(
+    port_id: int = Path(..., description="The ID of the port"),
+    start: Optional[int] = Query(None, description="Window start (epoch seconds)"),
+    end: Optional[int] = Query(None, description="Window end (epoch seconds), defaults to now")
+):
+    start, end = _history_window(start, end)
+    try:
+        rates = await asyncio.to_thread(get_counter_history().rates, port_id, start, end)
+        return {"port_id": port_id, "start": start, "end": end, "rates": rates}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-            top_5 = sorted(
-                failures.items(),
-                key=lambda x: len(x[1]),
-                reverse=True
-            )[:5]
+@router.get(
+    "/ports/failures",
+    summary="Get devices with top port failures",
+    description="Returns the k devices with the most down (non-ignored) ports from the in-memory port snapshot. details=false omits the port label lists.",
+    tags=["Ports"]
+)
+async def get_top_failures(
+    k: int = Query(FAILURE_TOP_K, ge=1, le=1000, description="Number of devices to return"),
+    details: bool = Query(True, description="Include the labels of the down ports")
+):
+    try:
+        snapshot = await port_snapshot.get()
+        return snapshot.top_failures(k, details)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-            return [
-                {
-                    "device": device,
-                    "fail_count": len(ports),
-                    "ports": ports
-                }
-                for device, ports in top_5
-            ]
+@router.get(
+    "/ports/failures/trend",
+    summary="Get devices with growing port failures",
+    description="Compares the first and last failure snapshots recorded in the local history over the last N days and returns the devices whose down-port count grew the most.",
+    tags=["Ports"]
+)
+async def get_failures_trend(
+    days: float = Query(7, gt=0, le=365, description="Window size in days"),
+    k: int = Query(10, ge=1, le=1000, description="Number of devices to return")
+):
+    try:
+        return await asyncio.to_thread(get_failure_history().trend, days, k)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 async def save_failures_data():
-    """Función async para guardar datos de fallas, manteniendo solo un registro en la tabla"""
+    """Función async para guardar datos de fallas como una nueva versión del snapshot"""
     try:
         print("Extrayendo datos de la ruta de top failures")
         # Obtener datos de la API
-        failures_data = await get_top_failures()
+        failures_data = await get_top_failures(FAILURE_TOP_K, True)
         print("HECHo")
         
-        # Verificar y limpiar registros existentes
-        existing = supabase.table("ports_failures").select("*").execute()
-        if len(existing.data) > 0:
-            # Eliminar todos los registros existentes
-            supabase.table("ports_failures").delete().neq("id", "").execute()
-        
         print("Insertando los datos a la BD")
 
-        # Insertar el nuevo registro
-        result = supabase.table("ports_failures").insert({
-            "response": failures_data
-        }).execute()
+        # Insertar la nueva versión (las antiguas se podan después)
+        row = await failures_store.write(failures_data)
         
         print("Datos insertados correctamente a la BD")
 
         return {
             "message": "Failures data stored successfully",
-            "id": result.data[0]["id"]
+            "id": row["id"]
         }
     except Exception as e:
         print(f"Error saving failures data: {str(e)}")
@@ -332,16 +314,16 @@ async def save_failures_data():
     tags=["Ports DB"],
     response_model=list  # Ajusta según la estructura real de tus datos
 )
-async def get_failures_from_db():
+async def get_failures_from_db(request: Request):
     try:
-        # Obtener el único registro de la tabla ports_failures
-        response = supabase.table("ports_failures").select("response").execute()
+        # Obtener la versión más reciente de la tabla ports_failures
+        snapshot = await failures_store.cached()
         
-        if not response.data:
+        if snapshot is None:
             raise HTTPException(status_code=404, detail="No failures data found in database")
         
         # Retornar directamente el contenido del campo response
-        return response.data[0]["response"]
+        return snapshot_response(request, snapshot)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -354,15 +336,14 @@ async def get_failures_from_db():
 async def Ports_get_id(port_id: int = Path(..., description="The ID of the alert to retrieve"),
 ):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{OBSERVIUM_API_BASE}/ports/{port_id}",
-                auth=(OBS_USER,OBS_PASS)
-            )
+        client = get_observium_client()
+        response = await client.get(
+            f"{OBSERVIUM_API_BASE}/ports/{port_id}"
+        )
 
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch device")
-            
-            return response.json()
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Failed to fetch device")
+        
+        return response.json()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
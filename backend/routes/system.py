@@ -0,0 +1,65 @@
+from fastapi import APIRouter, HTTPException, Path
+from core.observium import get_pool_stats
+from core.forecast_cache import get_forecast_cache
+from core.device_cache import device_cache, device_inventory
+from core.job_runs import job_telemetry
+
+router = APIRouter()
+
+@router.get(
+    "/system/observium-pool",
+    summary="Get Observium connection pool statistics",
+    description="Returns the state of the shared Observium HTTP client: pool limits, open/idle connections, request count and average latency.",
+    tags=["System"]
+)
+async def get_observium_pool_stats():
+    return get_pool_stats()
+
+@router.get(
+    "/system/forecast-cache",
+    summary="Get forecast cache statistics",
+    description="Returns entries, size on disk and hit/miss counters of the per-series forecast cache.",
+    tags=["System"]
+)
+async def get_forecast_cache_stats():
+    return get_forecast_cache().stats()
+
+@router.delete(
+    "/system/forecast-cache",
+    summary="Clear the forecast cache",
+    description="Removes every cached forecast so the next prediction run refits all series.",
+    tags=["System"]
+)
+async def clear_forecast_cache():
+    get_forecast_cache().clear()
+    return {"status": "success", "message": "Forecast cache cleared"}
+
+@router.get(
+    "/system/device-cache",
+    summary="Get device metadata cache statistics",
+    description="Returns entries, TTL and hit/miss/coalesced counters of the /devices/{id} cache.",
+    tags=["System"]
+)
+async def get_device_cache_stats():
+    return {**device_cache.stats(), "inventory": device_inventory.stats()}
+
+@router.get(
+    "/system/jobs",
+    summary="Get scheduled job telemetry",
+    description="Returns, for every scheduled job, its next run time, outcome counts, average duration, Observium calls made and the last run.",
+    tags=["System"]
+)
+async def get_jobs_stats():
+    return job_telemetry.stats()
+
+@router.get(
+    "/system/jobs/{job_id}",
+    summary="Get the run history of a scheduled job",
+    description="Returns the most recent runs of a job (duration, upstream call count, outcome and per-stage timings for pipelines).",
+    tags=["System"]
+)
+async def get_job_history(job_id: str = Path(..., description="Scheduled job id, e.g. graph_pipeline")):
+    summary = job_telemetry.summary(job_id)
+    if summary["runs"] == 0 and summary["next_run_time"] is None and summary["running_since"] is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {**summary, "history": job_telemetry.history(job_id)}
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Los módulos se importan como en producción (cwd=backend): from core.x import ...
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# core.supabase crea el cliente al importarse; en los tests nunca se llega a usar
+os.environ.setdefault("SUPABASE_URL", "http://localhost.supabase.co")
+os.environ.setdefault("SUPABASE_API_KEY", "test-key")
@@ -0,0 +1,74 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from core.encoded_body import EncodedBody
+from core.forecasting import PROPHET_STEP_SECONDS
+from core.snapshot_store import CachedSnapshot
+from routes import graphs
+
+DAY = 24 * 3600
+
+
+def _graph(points: int) -> dict:
+    return {
+        "meta": {
+            "start": 0,
+            "end": (points - 1) * DAY,
+            "step": DAY,
+            "legend": ["in", "out"],
+            "gprints": [],
+            "rules": [],
+        },
+        "data": [[float(i), -float(i)] for i in range(points)],
+    }
+
+
+def _prediction_client(monkeypatch, engine: str, steps: int = 36) -> tuple[TestClient, dict]:
+    async def fake_forecast(series, start, step, length, engine=None, steps=36, **kwargs):
+        return {idx: [float(length + k) for k in range(steps)] for idx, _, _ in series}
+
+    monkeypatch.setattr(graphs, "forecast_series", fake_forecast)
+    prediction = asyncio.run(graphs.build_prediction(_graph(20), engine, steps=steps))
+    snapshot = CachedSnapshot("graphs_prediction", 1, None, prediction, EncodedBody.from_value(prediction))
+
+    async def cached():
+        return snapshot
+
+    monkeypatch.setattr(graphs.prediction_store, "cached", cached)
+    app = FastAPI()
+    app.include_router(graphs.router)
+    return TestClient(app), prediction
+
+
+def test_prediction_query_ends_at_end_prediction(monkeypatch):
+    client, prediction = _prediction_client(monkeypatch, "prophet")
+    meta = prediction["meta"]
+    assert meta["forecast_step"] == PROPHET_STEP_SECONDS
+
+    response = client.get("/graphs_query", params={"source": "prediction", "max_points": 1000})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["meta"]["end"] == meta["end_prediction"]
+    assert body["series"][0]["timestamps"][-1] == meta["end_prediction"]
+    # Las filas históricas conservan meta.start + i * meta.step
+    assert body["series"][0]["timestamps"][:20] == [i * DAY for i in range(20)]
+
+
+def test_prediction_query_filters_forecast_by_time(monkeypatch):
+    client, prediction = _prediction_client(monkeypatch, "prophet", steps=4)
+    start_prediction = prediction["meta"]["start_prediction"]
+
+    response = client.get(
+        "/graphs_query",
+        params={"source": "prediction", "start": start_prediction + 1, "max_points": 1000},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["meta"]["source_points"] == 4
+    assert body["series"][0]["timestamps"] == [start_prediction + k * PROPHET_STEP_SECONDS for k in range(1, 5)]
+
+
+def test_linear_prediction_uses_graph_step(monkeypatch):
+    client, prediction = _prediction_client(monkeypatch, "linear", steps=5)
+    response = client.get("/graphs_query", params={"source": "prediction", "max_points": 1000})
+    assert response.json()["meta"]["end"] == prediction["meta"]["end_prediction"] == prediction["meta"]["end"] + 5 * DAY